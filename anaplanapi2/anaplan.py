@@ -5,15 +5,34 @@
 #                 download files from Anaplan server, and execute actions.
 #===============================================================================
 
-import requests
-import json
 import os
 from anaplanapi2 import anaplan_auth
 from anaplanapi2 import anaplan_resource_dictionary
-from time import sleep
+from anaplanapi2 import anaplan_fingerprint
+from anaplanapi2 import anaplan_sinks
+from anaplanapi2 import anaplan_tuning
+from anaplanapi2 import anaplan_governor
+from anaplanapi2 import anaplan_json
+from anaplanapi2 import anaplan_token_cache
+from anaplanapi2 import anaplan_schema
+from anaplanapi2 import anaplan_journal
+from anaplanapi2 import anaplan_validation
+from anaplanapi2 import anaplan_file_cache
+from time import sleep, monotonic
 import logging
 import io
 import pandas
+import csv
+import queue
+import contextvars
+import gzip
+import bz2
+import lzma
+import threading
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from types import SimpleNamespace
 
 #===============================================================================
 # Defining global variables
@@ -24,106 +43,265 @@ __post_body__ = {
         }
 __BYTES__ = 1024 * 1024
 __chunk__ = 0
+__auto_batch_rows__ = 1000
+__page_size__ = 500
+__import_metadata__ = {}
+__end_of_stream__ = object()
+__abort_stream__ = object()
+__poll_interval__ = 1
 #===========================================================================
 # This function reads the authentication type, Basic or Certificate, then passes
 # the remaining variables to anaplan_auth to generate the authorization for Anaplan API
 #===========================================================================
-def generate_authorization(auth_type, *args):    
+def generate_authorization(auth_type, *args, token_cache=None):    
     '''
     :param auth_type: 
     :param *args: Path to public certificate, and private key if auth_type='certificate'; Anaplan Username, Anaplan 
                   Password, and private key if auth_type='basic'
+    :param token_cache: Share tokens between processes on this host: True for the default cache file
+                        ~/.anaplanapi2/tokens.json, a path to a cache file, or an anaplan_token_cache.TokenCache
     '''
-        
+    
     if auth_type.lower() == 'basic':
         header_string = anaplan_auth.basic_auth_header(args[0], args[1])
-        
-        authorization = anaplan_auth.authenticate(anaplan_auth.auth_request(header_string, body=None))
-        return authorization
     elif auth_type.lower() == 'certificate':
         privKey = args[0]
         pubCert = args[1]
         
         header_string = anaplan_auth.certificate_auth_header(pubCert)
-        post_data = anaplan_auth.generate_post_data(privKey)
-        authorization = anaplan_auth.authenticate(anaplan_auth.auth_request(header_string, post_data))
-        if not authorization[:5] == "Error":
-            return authorization    
     else:
         return "Please enter a valid authentication method: Basic or Certificate"
+    
+    def authorize():
+        if auth_type.lower() == 'certificate':
+            #The nonce is signed only when a new token is actually requested
+            response = anaplan_auth.auth_request(header_string, anaplan_auth.generate_post_data(privKey))
+        else:
+            response = anaplan_auth.auth_request(header_string, body=None)
+        return anaplan_auth.authenticate(response), anaplan_auth.token_expiry(response)
+    
+    if token_cache:
+        if not isinstance(token_cache, anaplan_token_cache.TokenCache):
+            token_cache = anaplan_token_cache.TokenCache(None if token_cache is True else token_cache)
+        authorization = token_cache.get(token_cache.identity(header_string), authorize)
+    else:
+        authorization = authorize()[0]
+    
+    if auth_type.lower() == 'basic' or not authorization[:5] == "Error":
+        return authorization
 
 #===========================================================================
 # This function reads a flat file of an arbitrary size and uploads to Anaplan
 # in chunks of a size defined by the user.
 #===========================================================================
-def flat_file_upload(conn, fileId, chunkSize, file):
+def flat_file_upload(conn, fileId, chunkSize, file, job=None):
     '''
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param fileId: ID of the file in the Anaplan model
-    :param chunkSize: Desired size of the chunk, in megabytes
-    :param file: Path to the local file to be uploaded to Anaplan
+    :param chunkSize: Desired size of the chunk, in megabytes, or "auto" to tune it during the upload
+    :param file: Path to the local file to be uploaded to Anaplan, or a binary file-like object. Compressed
+                 .gz, .bz2, .xz and .zst files are decompressed while streaming.
+    :param job: With chunkSize="auto", name under which the tuned settings are saved for the next run
     '''
     
-    #Setting local variables for connection details
-    authorization = conn.authorization
-    workspaceGuid = conn.workspaceGuid
-    modelGuid = conn.modelGuid
+    return stream_upload_file(conn, fileId, file, chunkSize, job=job)
+
+#===========================================================================
+# This function uploads a local file or binary file-like object (a pipe, an
+# object-store stream, an open file) to Anaplan. Compressed sources are
+# decompressed on the fly, and chunks are cut on line boundaries, so no
+# uncompressed copy is ever written to disk.
+#===========================================================================
+def stream_upload_file(conn, file_id, source, chunkSize=10, compression="infer", job=None, max_in_flight=8):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param source: Path to the local file, or a binary file-like object
+    :param chunkSize: Maximum size of a chunk, in megabytes, or "auto" to tune it during the upload
+    :param compression: "gzip", "bz2", "xz", "zstd" or None; "infer" detects it from the file extension of a path
+    :param job: With chunkSize="auto", name under which the tuned settings are saved for the next run
+    :param max_in_flight: With chunkSize="auto", largest number of chunks uploaded at the same time
+    '''
     
+    tuner = None
+    if chunkSize == "auto":
+        tuner = anaplan_tuning.ChunkTuner(job, max_in_flight=max_in_flight)
+        chunk_bytes = tuner.chunk_bytes
     #Restrict users from entering a value for chunkSize greater than 50mb to prevent issues with API server
-    if chunkSize > 50:
+    elif chunkSize > 50:
         return "Chunk size must be 50mb or less."
     else:
+        chunk_bytes = int(__BYTES__ * chunkSize)
+    
+    if compression == "infer":
+        compression = _infer_compression(source)
+    
+    if isinstance(source, str):
+        raw = open(source, "rb")
+    else:
+        raw = source
+    
+    #The decompressors do not close the file object they wrap, so both are closed separately
+    stream = None
+    try:
+        if compression is not None:
+            stream = _decompress_stream(raw, compression)
+            if isinstance(stream, str):
+                message, stream = stream, None
+                return message
+        return _upload_chunks(conn, file_id, _read_line_chunks(stream or raw, chunk_bytes), tuner)
+    finally:
+        if stream is not None:
+            stream.close()
+        if isinstance(source, str):
+            raw.close()
+
+#===========================================================================
+# This function uploads many files at once, e.g. all the sources of a process.
+# Up to max_workers uploads run concurrently, each with its own start, chunk
+# and complete requests, and the smallest files are started first so they do
+# not queue behind large ones. With chunkSize="auto" the tuned uploads share
+# max_requests between them, so no more chunks are in flight across all
+# files. Returns a dict of file ID to the outcome of its upload.
+#===========================================================================
+def upload_many(conn, files, chunkSize=10, max_workers=4, max_requests=None):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param files: Dict of Anaplan file ID to a local file path, file-like object, bytes or dataframe
+    :param chunkSize: Maximum size of a chunk, in megabytes, or "auto" to tune it during each upload
+    :param max_workers: Maximum number of files uploading at the same time
+    :param max_requests: Maximum number of chunks uploading at the same time across all files, defaults to max_workers
+    '''
+    
+    #Restrict users from entering a value for chunkSize greater than 50mb to prevent issues with API server
+    if chunkSize != "auto" and chunkSize > 50:
+        return "Chunk size must be 50mb or less."
+    
+    max_workers = max(max_workers, 1)
+    max_in_flight = max(1, (max_requests or max_workers) // max_workers)
+    
+    def upload(file_id, source):
+        try:
+            if isinstance(source, pandas.DataFrame) and chunkSize == "auto":
+                return stream_upload_df(conn, file_id, source, "auto", max_in_flight=max_in_flight)
+            if isinstance(source, pandas.DataFrame):
+                batches = (source[start:start + __auto_batch_rows__] for start in range(0, len(source.index), __auto_batch_rows__))
+                chunks = _cut_chunks(_encode_rows(batches, None, __BYTES__ * 50), int(__BYTES__ * chunkSize))
+                return _upload_chunks(conn, file_id, chunks)
+            if isinstance(source, bytes):
+                source = io.BytesIO(source)
+            return stream_upload_file(conn, file_id, source, chunkSize, max_in_flight=max_in_flight)
+        except Exception as e:
+            return "There was an error uploading file " + file_id + ": " + str(e)
+    
+    order = sorted(files, key=lambda file_id: _source_size(files[file_id]))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {file_id: pool.submit(contextvars.copy_context().run, upload, file_id, files[file_id]) for file_id in order}
+        return {file_id: futures[file_id].result() for file_id in files}
+
+#===========================================================================
+# This function estimates the size of an upload source in bytes, for ordering
+# uploads. Sources whose size is unknown sort last.
+#===========================================================================
+def _source_size(source):
+    '''
+    :param source: Local file path, file-like object, bytes or dataframe
+    '''
+    
+    try:
+        if isinstance(source, pandas.DataFrame):
+            return int(source.memory_usage(deep=False).sum())
+        if isinstance(source, bytes):
+            return len(source)
+        if isinstance(source, str):
+            return os.path.getsize(source)
+        if hasattr(source, "getbuffer"):
+            return source.getbuffer().nbytes
+        return os.fstat(source.fileno()).st_size
+    except (OSError, AttributeError, ValueError):
+        return float("inf")
+
+#===========================================================================
+# This function infers the compression of a local file from its extension.
+#===========================================================================
+def _infer_compression(source):
+    '''
+    :param source: Path to the local file, or a binary file-like object
+    '''
+    
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    if not isinstance(name, str):
+        return None
+    
+    extensions = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+    
+    return extensions.get(os.path.splitext(name)[1].lower())
+
+#===========================================================================
+# This function wraps a binary stream in a decompressing reader. zstandard is
+# an optional dependency, only needed for .zst sources.
+#===========================================================================
+def _decompress_stream(stream, compression):
+    '''
+    :param stream: Binary file-like object holding compressed data
+    :param compression: "gzip", "bz2", "xz" or "zstd"
+    '''
+    
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    elif compression == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+    elif compression == "xz":
+        return lzma.LZMAFile(stream, mode="rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            return "The zstandard package is required to upload zstd compressed files."
+        return zstandard.ZstdDecompressor().stream_reader(stream, closefd=False)
+    else:
+        return "Unsupported compression: " + str(compression)
+
+#===========================================================================
+# This function reads a binary stream into chunks of at most chunk_bytes,
+# each ending on a line boundary. A single line longer than a chunk is sent
+# on its own.
+#===========================================================================
+def _read_line_chunks(stream, chunk_bytes):
+    '''
+    :param stream: Binary file-like object
+    :param chunk_bytes: Maximum size of a chunk, in bytes, or a function returning it before each chunk
+    '''
+    
+    remainder = b""
+    eof = False
+    while not eof:
+        limit = chunk_bytes() if callable(chunk_bytes) else chunk_bytes
+        blocks = [remainder]
+        size = len(remainder)
+        #Streams such as pipes may return short reads, keep reading until the chunk is full
+        while size < limit:
+            block = stream.read(limit - size)
+            if not block:
+                eof = True
+                break
+            if isinstance(block, str):
+                block = block.encode('utf-8')
+            blocks.append(block)
+            size += len(block)
+        data = b"".join(blocks)
         
-        #Assigning the size of the local file in MB
-        file_size = os.stat(file).st_size / __BYTES__
-        file_data = ""
-        
-        post_header = {
-                "Authorization": authorization,
-                  "Content-Type":"application/json"
-            }
-        put_header = {
-                "Authorization": authorization,
-                "Content-Type":"application/octet-stream"
-            }
-        file_metadata_start = {
-                    "id":fileId,
-                    "chunkCount":-1
-                      }
-        file_metadata_complete = {
-                      "id":fileId,
-                      "chunkCount": file_size / (__BYTES__ * chunkSize)
-                     }
-        url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/files/" + fileId
-    
-        start_upload_post = requests.post(url, headers=post_header, json=file_metadata_start)
-        #Confirm that the metadata update for the requested file was OK before proceeding with file upload
-        if start_upload_post.ok:
-            complete = True #Variable to track whether file has finished uploaded
-            with open(file, "rt") as f: #Loop through the file, reading a user-defined number of bytes until complete
-                chunkNum = 0
-                while True:
-                    buf=f.readlines(__BYTES__ * chunkSize)
-                    if not buf:
-                        break
-                    for item in buf:
-                        file_data += item
-                    file_upload = requests.put(url + "/chunks/" + str(chunkNum), headers=put_header, data=file_data)
-                    logging.debug("Uploading chunk " + str(chunkNum + 1) +", Status: " + file_upload.status_code)
-                    if not file_upload.ok:
-                        complete = False #If the upload fails, break the loop and prevent subsequent requests. Print error to screen
-                        logging.debug("Error " + str(file_upload.status_code) + '\n' + file_upload.text)
-                        break
-                    else:
-                        chunkNum += 1    
-            if complete:
-                complete_upload = requests.post(url + "/complete", headers=post_header, json=file_metadata_complete)
-                if complete_upload.ok:
-                    return "File upload complete, " + str(chunkNum) + " chunk(s) uploaded to the server."
-                else:
-                    return "There was an error with your request: " + complete_upload.status_code + " " + complete_upload.text
-        else:
-            return "There was an error with your request: " + start_upload_post.status_code + " " + start_upload_post.text
+        if eof:
+            remainder = data
+            break
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            cut = len(data)
+        yield data[:cut]
+        remainder = data[cut:]
+    
+    if remainder:
+        yield remainder
 
 #===========================================================================
 # This function uploads a data stream to Anaplan in a chunk of no larger
@@ -163,7 +341,7 @@ def stream_upload(conn, file_id, buffer, **args):
                       "id":file_id,
                       "chunkCount": __chunk__
                      }
-        complete_upload = requests.post(url=url + "/complete", headers=post_header, json=file_metadata_complete)
+        complete_upload = anaplan_governor.post(url=url + "/complete", headers=post_header, data=anaplan_json.dumps(file_metadata_complete))
         chunk_temp=__chunk__
         __chunk__ = 0
         if complete_upload.ok:
@@ -177,12 +355,12 @@ def stream_upload(conn, file_id, buffer, **args):
             return "Buffer too large, please send less than 50mb of data."
         else:    
             if __chunk__==0:
-                start_upload_post = requests.post(url, headers=post_header, json=stream_metadata_start)
+                start_upload_post = anaplan_governor.post(url, headers=post_header, data=anaplan_json.dumps(stream_metadata_start))
                 #Confirm that the metadata update for the requested file was OK before proceeding with file upload
                 if not start_upload_post.ok:
                     return "There was an error with your request: " + start_upload_post.status_code + " " + start_upload_post.text
                 
-            stream_upload = requests.put(url + "/chunks/" + str(__chunk__), headers=put_header, data=buffer)
+            stream_upload = anaplan_governor.put(url + "/chunks/" + str(__chunk__), headers=put_header, data=buffer)
             if not stream_upload.ok:
                 return "Error " + str(stream_upload.status_code) + '\n' + stream_upload.text
             else:
@@ -193,14 +371,21 @@ def stream_upload(conn, file_id, buffer, **args):
 # This function uploads a dataframe to Anaplan in chunks of no larger
 # than 50mb. 
 #===========================================================================
-def stream_upload_df(conn, file_id, df, chunk_size):
+def stream_upload_df(conn, file_id, df, chunk_size, job=None, max_in_flight=8):
     '''
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param fileId: ID of the file in the Anaplan model
     :param df: datafame to upload to Anaplan file
-    :param chunk_size: chunk row size
+    :param chunk_size: chunk row size, or "auto" to cut chunks by byte size tuned during the upload
+    :param job: With chunk_size="auto", name under which the tuned settings are saved for the next run
+    :param max_in_flight: With chunk_size="auto", largest number of chunks uploaded at the same time
     '''
-    str
+    
+    if chunk_size == "auto":
+        tuner = anaplan_tuning.ChunkTuner(job, max_in_flight=max_in_flight)
+        batches = (df[start:start + __auto_batch_rows__] for start in range(0, len(df.index), __auto_batch_rows__))
+        return _upload_chunks(conn, file_id, _cut_chunks(_encode_rows(batches, None, __BYTES__ * 50), tuner.chunk_bytes), tuner)
+    
     start_index=0
     end_index=0
     num_rows=len(df.index)
@@ -214,18 +399,397 @@ def stream_upload_df(conn, file_id, df, chunk_size):
         str_buffer.close()
         
     #complete the upload
-    stream_upload(conn, file_id, "",complete=True)
-    return
+    return stream_upload(conn, file_id, "",complete=True)
+
+#===========================================================================
+# This function uploads only the rows of a dataframe that were inserted or
+# changed since the last upload to the same file. Rows are fingerprinted on
+# the key column(s) and compared against a local index of the previous upload,
+# which is only replaced once the upload completes successfully.
+#===========================================================================
+def stream_upload_df_delta(conn, file_id, df, chunk_size, key, index_dir=None):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param df: dataframe to upload to Anaplan file
+    :param chunk_size: chunk row size
+    :param key: Column name, or list of column names, that uniquely identifies a row
+    :param index_dir: Directory holding the fingerprint indexes, defaults to ~/.anaplanapi2/fingerprints
+    :returns: Tuple of the upload status message and a dataframe of the key values deleted since the last upload
+    '''
+    
+    path = anaplan_fingerprint.index_path(conn.workspaceGuid, conn.modelGuid, file_id, index_dir)
+    
+    try:
+        current = anaplan_fingerprint.fingerprint(df, key)
+    except ValueError as e:
+        return "There was an error with your request: " + str(e), df[[key] if isinstance(key, str) else key].iloc[0:0]
+    previous = anaplan_fingerprint.load_index(path)
+    inserted, changed, deleted = anaplan_fingerprint.compare(current, previous, key)
+    
+    delta_df = df[(inserted | changed).values]
+    logging.debug("Delta upload: " + str(int(inserted.sum())) + " inserted, " + str(int(changed.sum())) + " changed, " + str(len(deleted.index)) + " deleted row(s).")
+    
+    if len(delta_df.index) == 0:
+        anaplan_fingerprint.save_index(current, path)
+        return "No inserted or changed rows, nothing uploaded to the server.", deleted
+    
+    #The chunks go through _upload_chunks, which stops at the first failed PUT, so the index is only
+    #replaced once every changed row has reached the server
+    chunks = (delta_df[start:start + chunk_size].to_csv(index=False, header=(start == 0)).encode('utf-8')
+              for start in range(0, len(delta_df.index), chunk_size))
+    status = _upload_chunks(conn, file_id, chunks)
+    if status.startswith("File upload complete"):
+        anaplan_fingerprint.save_index(current, path)
+    
+    return status, deleted
+#===========================================================================
+# This function uploads a dataframe to Anaplan using a pipeline: slices of the
+# dataframe are serialized to CSV bytes in a process pool, at most queue_size
+# serialized chunks are held between the stages, and the calling thread PUTs
+# finished chunks in order while the next ones are being serialized. On
+# platforms that spawn worker processes the caller must be guarded by
+# if __name__ == "__main__".
+#===========================================================================
+def stream_upload_df_parallel(conn, file_id, df, chunk_size, workers=None, queue_size=4):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param df: dataframe to upload to Anaplan file
+    :param chunk_size: chunk row size
+    :param workers: Number of serialization processes, defaults to the number of CPUs
+    :param queue_size: Maximum number of chunks serialized ahead of the upload
+    '''
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return _upload_chunks(conn, file_id, _serialize_df_chunks(pool, df, chunk_size, queue_size))
+
+#===========================================================================
+# This function submits dataframe slices to the process pool and yields the
+# serialized chunks in their original order. No more than queue_size slices
+# are outstanding at once, so memory stays bounded by the queue.
+#===========================================================================
+def _serialize_df_chunks(pool, df, chunk_size, queue_size):
+    '''
+    :param pool: ProcessPoolExecutor used to serialize the slices
+    :param df: dataframe to upload to Anaplan file
+    :param chunk_size: chunk row size
+    :param queue_size: Maximum number of chunks serialized ahead of the upload
+    '''
+    
+    pending = deque()
+    start_index = 0
+    num_rows = len(df.index)
+    
+    while start_index < num_rows or pending:
+        while start_index < num_rows and len(pending) < max(queue_size, 1):
+            pending.append(pool.submit(_serialize_chunk, df[start_index:start_index + chunk_size], start_index == 0))
+            start_index += chunk_size
+        yield pending.popleft().result()
+
+#===========================================================================
+# This function serializes a dataframe slice to CSV bytes. It runs in a worker
+# process, so it must stay a module-level function.
+#===========================================================================
+def _serialize_chunk(chunk_df, header):
+    '''
+    :param chunk_df: dataframe slice to serialize
+    :param header: True if the column names should be written, only for the first chunk
+    '''
+    
+    return chunk_df.to_csv(index=False, header=header).encode('utf-8')
+
+#===========================================================================
+# This function uploads any iterable of rows to Anaplan without materializing
+# it. Rows may be tuples, lists or dicts, or record batches (dataframes, or
+# objects with a to_pandas method such as Arrow record batches); a DB-API
+# cursor can be passed directly and its column names are used as the header.
+# Rows are encoded on the calling thread into chunks of at most chunkSize
+# megabytes while a background thread PUTs them; once max_pending chunks are
+# waiting, the producer blocks until a PUT finishes.
+#===========================================================================
+def stream_upload_rows(conn, file_id, rows, header=None, chunkSize=10, max_pending=2):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param rows: Iterable of rows or record batches, or a DB-API cursor
+    :param header: List of column names written as the first line, defaults to the cursor description or dict keys
+    :param chunkSize: Maximum size of a chunk, in megabytes
+    :param max_pending: Maximum number of encoded chunks waiting to be uploaded
+    '''
+    
+    #Restrict users from entering a value for chunkSize greater than 50mb to prevent issues with API server
+    if chunkSize > 50:
+        return "Chunk size must be 50mb or less."
+    
+    if header is None and getattr(rows, "description", None):
+        header = [column[0] for column in rows.description]
+    
+    pending = queue.Queue(maxsize=max(max_pending, 1))
+    result = []
+    uploader = threading.Thread(target=contextvars.copy_context().run, args=(_upload_from_queue, conn, file_id, pending, result))
+    uploader.daemon = True
+    uploader.start()
+    
+    end_of_stream = __abort_stream__
+    try:
+        for chunk in _cut_chunks(_encode_rows(rows, header, __BYTES__ * chunkSize), __BYTES__ * chunkSize):
+            if not _put_pending(pending, chunk, uploader):
+                break
+        end_of_stream = __end_of_stream__
+    finally:
+        _put_pending(pending, end_of_stream, uploader)
+        uploader.join()
+    
+    if not result:
+        return "Upload aborted, the uploader stopped without reporting a result."
+    return result[0]
+
+#===========================================================================
+# This function places an item on the upload queue, blocking while the queue
+# is full. It gives up if the uploader has stopped, e.g. after a failed PUT.
+#===========================================================================
+def _put_pending(pending, item, uploader):
+    '''
+    :param pending: Bounded queue feeding the uploader thread
+    :param item: Encoded chunk, or an end of stream marker
+    :param uploader: Thread consuming the queue
+    '''
+    
+    while uploader.is_alive():
+        try:
+            pending.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    
+    return False
+
+#===========================================================================
+# This function runs on the uploader thread. It uploads the chunks taken from
+# the queue and stores the status message. If the producer failed, the upload
+# is left incomplete rather than completing it with partial data.
+#===========================================================================
+def _upload_from_queue(conn, file_id, pending, result):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param pending: Bounded queue of encoded chunks
+    :param result: List the status message is appended to
+    '''
+    
+    def drain():
+        while True:
+            chunk = pending.get()
+            if chunk is __end_of_stream__:
+                return
+            if chunk is __abort_stream__:
+                raise RuntimeError("Row producer failed")
+            yield chunk
+    
+    try:
+        result.append(_upload_chunks(conn, file_id, drain()))
+    except RuntimeError as e:
+        result.append("Upload aborted, the upload was not completed: " + str(e))
+    except Exception as e:
+        #Any other error, e.g. a dropped connection during a PUT, would otherwise end the thread silently
+        logging.debug("Uploader thread failed: " + repr(e))
+        result.append("There was an error with your request: " + str(e))
+
+#===========================================================================
+# This function encodes rows and record batches as CSV, yielding the bytes of
+# each row or batch. Batches larger than what a chunk can hold are split in
+# half until they fit.
+#===========================================================================
+def _encode_rows(rows, header, max_bytes):
+    '''
+    :param rows: Iterable of rows or record batches
+    :param header: List of column names, or None
+    :param max_bytes: Largest encoded batch that may be yielded in one piece
+    '''
+    
+    lines = []
+    writer = csv.writer(SimpleNamespace(write=lines.append), lineterminator="\n")
+    header_written = False
+    
+    for row in rows:
+        if hasattr(row, "to_pandas"):
+            row = row.to_pandas()
+        if isinstance(row, dict) and header is None:
+            header = list(row.keys())
+        if isinstance(row, pandas.DataFrame) and header is None:
+            header = [str(column) for column in row.columns]
+        if not header_written:
+            if header is not None:
+                writer.writerow(header)
+                yield lines.pop().encode('utf-8')
+            header_written = True
+        
+        if isinstance(row, pandas.DataFrame):
+            for piece in _encode_batch(row, max_bytes):
+                yield piece
+        else:
+            if isinstance(row, dict):
+                row = [row.get(column) for column in header]
+            writer.writerow(row)
+            yield lines.pop().encode('utf-8')
+
+#===========================================================================
+# This function encodes a dataframe batch, splitting it until every piece is
+# no larger than max_bytes.
+#===========================================================================
+def _encode_batch(batch_df, max_bytes):
+    '''
+    :param batch_df: dataframe holding a batch of rows
+    :param max_bytes: Largest encoded piece that may be yielded
+    '''
+    
+    data = batch_df.to_csv(index=False, header=False).encode('utf-8')
+    if len(data) <= max_bytes or len(batch_df.index) < 2:
+        yield data
+    else:
+        middle = len(batch_df.index) // 2
+        for piece in _encode_batch(batch_df[:middle], max_bytes):
+            yield piece
+        for piece in _encode_batch(batch_df[middle:], max_bytes):
+            yield piece
+
+#===========================================================================
+# This function groups encoded pieces into chunks of at most chunk_bytes. A
+# piece is never split, so chunks always end on a row boundary.
+#===========================================================================
+def _cut_chunks(pieces, chunk_bytes):
+    '''
+    :param pieces: Iterable of bytes, each ending on a row boundary
+    :param chunk_bytes: Maximum size of a chunk, in bytes, or a function returning it
+    '''
+    
+    parts = []
+    size = 0
+    for piece in pieces:
+        limit = chunk_bytes() if callable(chunk_bytes) else chunk_bytes
+        if parts and size + len(piece) > limit:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+        parts.append(piece)
+        size += len(piece)
+    if parts:
+        yield b"".join(parts)
+
+#===========================================================================
+# This function uploads an iterable of byte chunks to an Anaplan file: it
+# starts the upload, PUTs each chunk in order, then completes the upload with
+# the final chunk count.
+#===========================================================================
+def _upload_chunks(conn, file_id, chunks, tuner=None):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param file_id: ID of the file in the Anaplan model
+    :param chunks: Iterable of bytes objects, each no larger than 50mb
+    :param tuner: anaplan_tuning.ChunkTuner; when given, chunks are PUT concurrently and timed to tune the upload
+    '''
+    
+    authorization = conn.authorization
+    workspaceGuid = conn.workspaceGuid
+    modelGuid = conn.modelGuid
+    
+    post_header = {
+            "Authorization": authorization,
+            "Content-Type":"application/json"
+        }
+    put_header = {
+            "Authorization": authorization,
+            "Content-Type":"application/octet-stream"
+        }
+    url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/files/" + file_id
+    
+    start_upload_post = anaplan_governor.post(url, headers=post_header, data=anaplan_json.dumps({"id":file_id, "chunkCount":-1}))
+    #Confirm that the metadata update for the requested file was OK before proceeding with file upload
+    if not start_upload_post.ok:
+        return "There was an error with your request: " + str(start_upload_post.status_code) + " " + start_upload_post.text
+    
+    if tuner is None:
+        chunkNum = 0
+        for chunk in chunks:
+            if len(chunk) > __BYTES__ * 50:
+                return "Chunk " + str(chunkNum + 1) + " is larger than 50mb, please use a smaller chunk size."
+            file_upload = anaplan_governor.put(url + "/chunks/" + str(chunkNum), headers=put_header, data=chunk)
+            logging.debug("Uploading chunk " + str(chunkNum + 1) + ", Status: " + str(file_upload.status_code))
+            if not file_upload.ok:
+                return "Error " + str(file_upload.status_code) + '\n' + file_upload.text
+            chunkNum += 1
+    else:
+        chunkNum = _put_chunks_tuned(url, put_header, chunks, tuner)
+        if isinstance(chunkNum, str):
+            return chunkNum
+        tuner.save()
+    
+    complete_upload = anaplan_governor.post(url + "/complete", headers=post_header, data=anaplan_json.dumps({"id":file_id, "chunkCount":chunkNum}))
+    if complete_upload.ok:
+        return "File upload complete, " + str(chunkNum) + " chunk(s) uploaded to the server."
+    else:
+        return "There was an error with your request: " + str(complete_upload.status_code) + " " + complete_upload.text
+
+#===========================================================================
+# This function PUTs chunks with up to tuner.in_flight requests outstanding,
+# reporting each completed chunk to the tuner. Chunk numbers follow the order
+# of the iterable, so the file is reassembled correctly whatever order the
+# requests complete in. Returns the chunk count, or an error message.
+#===========================================================================
+def _put_chunks_tuned(url, put_header, chunks, tuner):
+    '''
+    :param url: URL of the Anaplan file
+    :param put_header: Authorization and content type header for the chunk PUT requests
+    :param chunks: Iterable of bytes objects, each no larger than 50mb
+    :param tuner: anaplan_tuning.ChunkTuner that sets the concurrency and receives the measurements
+    '''
+    
+    def put(chunkNum, chunk):
+        file_upload = anaplan_governor.put(url + "/chunks/" + str(chunkNum), headers=put_header, data=chunk)
+        logging.debug("Uploading chunk " + str(chunkNum + 1) + ", Status: " + str(file_upload.status_code))
+        if file_upload.ok:
+            tuner.record(len(chunk))
+        return file_upload
+    
+    def failed(done):
+        for future in done:
+            if not future.result().ok:
+                return "Error " + str(future.result().status_code) + '\n' + future.result().text
+    
+    chunkNum = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=tuner.max_in_flight) as pool:
+        for chunk in chunks:
+            if len(chunk) > __BYTES__ * 50:
+                return "Chunk " + str(chunkNum + 1) + " is larger than 50mb, please use a smaller chunk size."
+            while len(pending) >= tuner.in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                error = failed(done)
+                if error:
+                    return error
+            pending.add(pool.submit(contextvars.copy_context().run, put, chunkNum, chunk))
+            chunkNum += 1
+        error = failed(wait(pending)[0])
+        if error:
+            return error
+    
+    return chunkNum
+
 #===========================================================================
 # This function reads the ID of the desired action to run, POSTs the task
 # to the Anaplan API to execute the action, then monitors the status until
-# complete.
+# complete. With a journal, the task is recorded while it runs so that its
+# monitoring can be resumed with resume_tasks if this process dies.
 #===========================================================================
-def execute_action(conn, actionId, retryCount):
+def execute_action(conn, actionId, retryCount, journal=None, progress=None, deadline=None):
     '''
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param actionId: ID of the action in the Anaplan model
     :param retryCount: The number of times to attempt to retry the action if it fails
+    :param journal: Path to a local journal file recording the task while it runs
+    :param progress: Function called with a progress event on every poll, see iter_task_progress
+    :param deadline: Seconds the task may run before it is cancelled on the server
     '''
     
     authorization = conn.authorization
@@ -238,27 +802,120 @@ def execute_action(conn, actionId, retryCount):
         }
     
     if actionId[:3] == "112":
-        logging.debug("Running action " + actionId)
         url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/imports/" + actionId + "/tasks"
-        taskId = run_action(url, post_header, retryCount)
-        return check_status(url, taskId, post_header)
     elif actionId[:3] == "116":
-        logging.debug("Running action " + actionId)
         url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/exports/" + actionId + "/tasks"      
-        taskId = run_action(url, post_header, retryCount)
-        return check_status(url, taskId, post_header)
     elif actionId[:3] == "117":
-        logging.debug("Running action " + actionId)
         url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/actions/" + actionId + "/tasks"
-        taskId = run_action(url, post_header, retryCount)
-        return check_status(url, taskId, post_header)
     elif actionId[:3] == "118":
-        logging.debug("Running action " + actionId)
         url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/processes/" + actionId + "/tasks"
-        taskId = run_action(url, post_header, retryCount)
-        return check_status(url, taskId, post_header)
     else:
         logging.debug("Incorrect action ID provided!")
+        return
+    
+    logging.debug("Running action " + actionId)
+    taskId = run_action(url, post_header, retryCount)
+    if journal:
+        anaplan_journal.record(journal, url, taskId, actionId, workspaceGuid, modelGuid)
+    
+    results = check_status(url, taskId, post_header, progress=progress, deadline=deadline)
+    if journal:
+        anaplan_journal.remove(journal, taskId)
+    
+    return results
+
+#===========================================================================
+# This function resumes monitoring the tasks left in a journal by a process
+# that stopped before they finished, e.g. after a restart. Each task is
+# polled until complete with the connection's current authorization, its
+# results collected and its journal entry removed, so the actions never have
+# to be run again. Tasks the server no longer knows (404) are reported and
+# removed. Returns a list of (actionId, taskId, results).
+#===========================================================================
+def resume_tasks(conn, journal):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param journal: Path to the journal file passed to execute_action
+    '''
+    
+    post_header = {
+            'Authorization': conn.authorization,
+            'Content-Type':'application/json'
+        }
+    
+    resumed = []
+    for entry in anaplan_journal.entries(journal, conn.workspaceGuid, conn.modelGuid):
+        logging.debug("Resuming task " + entry["taskId"] + " of action " + entry["actionId"])
+        #A task the server no longer knows is dropped from the journal, other errors leave it for the next call
+        get_status = anaplan_governor.get(entry["url"] + "/" + entry["taskId"], headers=post_header)
+        if not get_status.ok:
+            if get_status.status_code in (404, 410):
+                anaplan_journal.remove(journal, entry["taskId"])
+            results = "There was an error with your request: " + str(get_status.status_code) + " " + get_status.text
+            resumed.append((entry["actionId"], entry["taskId"], results))
+            continue
+        results = check_status(entry["url"], entry["taskId"], post_header)
+        anaplan_journal.remove(journal, entry["taskId"])
+        resumed.append((entry["actionId"], entry["taskId"], results))
+    
+    return resumed
+
+#===========================================================================
+# This function checks a local file or dataframe against the data source
+# definition of an import before anything is uploaded: separator, header
+# names, column count of every row and, optionally, date formats. Returns a
+# list of error messages with row and column positions, empty if the data
+# is valid.
+#===========================================================================
+def validate_upload(conn, importId, data, date_columns=None, max_errors=100):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param importId: ID of the import the data will be loaded by
+    :param data: Path to the local file, or dataframe, to be uploaded
+    :param date_columns: Dict of column name to strftime format, e.g. {"Date": "%d/%m/%Y"}
+    :param max_errors: Stop after this many errors
+    '''
+    
+    metadata = get_import_metadata(conn, importId)
+    if isinstance(metadata, str):
+        return [metadata]
+    source = metadata.get("source", {})
+    
+    if isinstance(data, pandas.DataFrame):
+        return anaplan_validation.validate_dataframe(data, source, date_columns, max_errors)
+    else:
+        return anaplan_validation.validate_file(data, source, date_columns, max_errors)
+
+#===========================================================================
+# This function returns the metadata of an import, including the column
+# names, separator and header row of its data source. The metadata is cached
+# for the life of the process; refresh=True fetches it again.
+#===========================================================================
+def get_import_metadata(conn, importId, refresh=False):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param importId: ID of the import in the Anaplan model
+    :param refresh: True to ignore the cached metadata
+    '''
+    
+    key = (conn.workspaceGuid, conn.modelGuid, importId)
+    if not refresh and key in __import_metadata__:
+        return __import_metadata__[key]
+    
+    get_header = {
+                "Authorization": conn.authorization,
+                "Content-Type":"application/json"
+    }
+    url = __base_url__ + "/" + conn.workspaceGuid + "/models/" + conn.modelGuid + "/imports/" + importId
+    
+    response = anaplan_governor.get(url, headers=get_header)
+    if not response.ok:
+        return "There was a problem fetching the import metadata: " + str(response.status_code) + " " + response.text
+    
+    metadata = anaplan_json.response_json(response)["importMetadata"]
+    __import_metadata__[key] = metadata
+    
+    return metadata
 
 #===========================================================================
 # This function executes the Anaplan action, if there is a server error it
@@ -276,16 +933,16 @@ def run_action(url, post_header, retryCount):
     sleepTime = 10
         
     while True:
-        run_action = requests.post(url, headers=post_header, json=__post_body__)
+        run_action = anaplan_governor.post(url, headers=post_header, data=anaplan_json.dumps(__post_body__))
         
         if run_action.status_code != 200 and state < retryCount:
             sleep(sleepTime)
-            run_action = requests.post(url, headers=post_header, json=__post_body__)
+            run_action = anaplan_governor.post(url, headers=post_header, data=anaplan_json.dumps(__post_body__))
             state += 1
             sleepTime = sleepTime * 1.5
         else:
             break
-    taskId = json.loads(run_action.text)
+    taskId = anaplan_json.response_json(run_action)
     taskId = taskId["task"]
     
     return taskId["taskId"]
@@ -300,45 +957,84 @@ def execute_action_with_parameters(conn, actionId, retryCount, **params):
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param actionId: ID of the action in the Anaplan model
     :param retryCount: The number of times to attempt to retry the action if it fails
+    :param **params: Mapping parameters, the dimension name as the key and the item name as the value
     '''
     
-    authorization = conn.authorization
-    workspaceGuid = conn.workspaceGuid
-    modelGuid = conn.modelGuid
-    
     post_header = {
-            'Authorization': authorization,
+            'Authorization': conn.authorization,
             'Content-Type':'application/json'
         }
+    post_body = {
+                    "localeName":"en_US","mappingParameters": build_mapping_parameters(params)
+                }
     
-    body = ""
+    url = _parameterized_action_url(conn, actionId)
+    if url is None:
+        logging.debug("Incorrect action ID provided! Only imports and processes may be executed with parameters.")
+        return
     
-    if len(params) > 1:
-        for key, value in params.items():
-            body += "\"entityType:\"" + key + "\"" + ",\"entityType:\"" + value + "\"" + ","
-        body = body[:-1]
-        body = "[" + body + "]"
-    else:
-        for key, value in params.items():
-            body += "[\"" + key + "\"" + ":" + "\"" + value + "\"]"
+    logging.debug("Running action " + actionId)
+    taskId = run_action_with_parameters(url, post_header, retryCount, post_body)
+    return check_status(url, taskId, post_header)
+
+#===========================================================================
+# This function runs one import or process once for every set of mapping
+# parameters, e.g. once per region. Up to max_workers tasks are created and
+# monitored at the same time; Anaplan queues tasks a model cannot run in
+# parallel, so max_workers=1 restores strictly serial execution. The results
+# are returned in the order of parameter_sets.
+#===========================================================================
+def execute_actions_with_parameters(conn, actionId, retryCount, parameter_sets, max_workers=4):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param actionId: ID of the import or process in the Anaplan model
+    :param retryCount: The number of times to attempt to retry the action if it fails
+    :param parameter_sets: List of dicts of mapping parameters, the dimension name as the key and the item name as the value
+    :param max_workers: Maximum number of parameter sets running at the same time
+    '''
     
+    if _parameterized_action_url(conn, actionId) is None:
+        logging.debug("Incorrect action ID provided! Only imports and processes may be executed with parameters.")
+        return
     
-    post_body = {
-                    "localeName":"en_US","mappingParameters": body
-                }
+    def run(params):
+        try:
+            return execute_action_with_parameters(conn, actionId, retryCount, **params)
+        except Exception as e:
+            return "There was an error running the action with parameters " + str(params) + ": " + str(e)
+    
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, params) for params in parameter_sets]
+        return [future.result() for future in futures]
+
+#===========================================================================
+# This function builds the mappingParameters list of the task request body.
+#===========================================================================
+def build_mapping_parameters(params):
+    '''
+    :param params: Dict with the dimension name as the key and the item name as the value
+    '''
+    
+    return [{"entityType": str(key), "entityName": str(value)} for key, value in params.items()]
+
+#===========================================================================
+# This function returns the task URL of an import or process, or None for any
+# other action type since only these accept mapping parameters.
+#===========================================================================
+def _parameterized_action_url(conn, actionId):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param actionId: ID of the action in the Anaplan model
+    '''
     
     if actionId[:3] == "112":
-        logging.debug("Running action " + actionId)
-        url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/imports/" + actionId + "/tasks"
-        taskId = run_action_with_parameters(url, post_header, retryCount, post_body)
-        return check_status(url, taskId, post_header)
+        resource = "/imports/"
     elif actionId[:3] == "118":
-        logging.debug("Running action " + actionId)
-        url = __base_url__ + "/" +workspaceGuid + "/models/" + modelGuid + "/processes/" + actionId + "/tasks"
-        taskId = run_action(url, post_header, retryCount, post_body)
-        return check_status(url, taskId, post_header)
+        resource = "/processes/"
     else:
-        logging.debug("Incorrect action ID provided! Only imports and processes may be executed with parameters.")
+        return None
+    
+    return __base_url__ + "/" + conn.workspaceGuid + "/models/" + conn.modelGuid + resource + actionId + "/tasks"
 
 #===========================================================================
 # This function executes the Anaplan import or process with mapping parameters,
@@ -350,21 +1046,22 @@ def run_action_with_parameters(url, post_header, retryCount, post_body):
     @param url: POST URL for Anaplan action
     @param post_header: Authorization header string
     @param retryCount: Number of times to retry executino of the action
+    @param post_body: Task request body including the mapping parameters
     '''
     
     state = 0
     sleepTime = 10
         
     while True:
-        run_action = requests.post(url, headers=post_header, json=post_body)
+        run_action = anaplan_governor.post(url, headers=post_header, data=anaplan_json.dumps(post_body))
         if run_action.status_code != 200 and state < retryCount:
             sleep(sleepTime)
-            run_import = requests.post(url, headers=post_header, json=post_body)
             state += 1
             sleepTime = sleepTime * 1.5
         else:
             break
-    taskId = json.loads(run_import.text)
+    taskId = anaplan_json.response_json(run_action)
+    taskId = taskId["task"]
     
     return taskId["taskId"]
 
@@ -372,23 +1069,89 @@ def run_action_with_parameters(url, post_header, retryCount, post_body):
 # This function monitors the status of Anaplan action. Once complete it returns
 # the JSON text of the response.
 #===========================================================================        
-def check_status(url, taskId, post_header):
+def check_status(url, taskId, post_header, progress=None, deadline=None, poll_interval=__poll_interval__):
     '''
     @param url: Anaplan task URL
     @param taskId: ID of the Anaplan task executed
     @param post_header: Authorization header value
+    @param progress: Function called with a progress event on every poll, see iter_task_progress
+    @param deadline: Seconds the task may run before it is cancelled on the server
+    @param poll_interval: Seconds between polls of the task status
     '''
     
+    for event in iter_task_progress(url, taskId, post_header, deadline, poll_interval):
+        if progress is not None:
+            progress(event)
+    
+    results = event["task"]
+    if results["taskState"] == "CANCELLED":
+        logging.debug("Task " + taskId + " was cancelled after " + str(round(event["elapsed"])) + " seconds.")
+        if event["cancelled"]:
+            return "The task was cancelled after exceeding its deadline of " + str(deadline) + " seconds."
+        return "The task was cancelled before it completed."
+    
+    return parse_task_response(results, url, taskId, post_header)
+
+#===========================================================================
+# This function polls an Anaplan task until it completes or is cancelled,
+# yielding a progress event after every poll: a dict with the task state,
+# current step, percent complete, seconds elapsed and the estimated seconds
+# remaining (None until the task reports progress), whether the deadline
+# cancelled the task, plus the raw task payload. Once the deadline has passed
+# the task is cancelled and polled until the server confirms it.
+#===========================================================================
+def iter_task_progress(url, taskId, post_header, deadline=None, poll_interval=__poll_interval__):
+    '''
+    :param url: Anaplan task URL
+    :param taskId: ID of the Anaplan task executed
+    :param post_header: Authorization header value
+    :param deadline: Seconds the task may run before it is cancelled on the server
+    :param poll_interval: Seconds between polls of the task status
+    '''
+    
+    start = monotonic()
+    cancelled = False
+    done = 0
+    
     while True:
-        get_status = requests.get(url + "/" + taskId, headers=post_header)
-        status = json.loads(get_status.text)
-        status = status["task"]["taskState"]
+        get_status = anaplan_governor.get(url + "/" + taskId, headers=post_header)
+        results = anaplan_json.response_json(get_status)["task"]
+        status = results["taskState"]
+        elapsed = monotonic() - start
+        
+        #Cancelled tasks report no progress, keep the last value seen
+        done = results.get("progress", done) or 0
         if status == "COMPLETE":
-            results = json.loads(get_status.text)
-            results = results["task"]
-            break   
+            done = 1.0
+        eta = elapsed * (1 - done) / done if done > 0 else None
+        
+        yield {"taskId": taskId, "taskState": status, "currentStep": results.get("currentStep"),
+               "percent": round(done * 100, 1), "elapsed": elapsed, "eta": eta, "cancelled": cancelled, "task": results}
+        
+        if status in ("COMPLETE", "CANCELLED"):
+            return
+        if deadline is not None and elapsed > deadline and not cancelled:
+            logging.debug("Task " + taskId + " exceeded its deadline of " + str(deadline) + " seconds, cancelling.")
+            cancelled = cancel_task(url, taskId, post_header)
+        sleep(poll_interval)
+
+#===========================================================================
+# This function cancels a running Anaplan task. The server stops the task at
+# its next safe point, so it may report CANCELLING for a while before it is
+# CANCELLED. Returns True if the cancellation was accepted.
+#===========================================================================
+def cancel_task(url, taskId, post_header):
+    '''
+    :param url: Anaplan task URL
+    :param taskId: ID of the Anaplan task to cancel
+    :param post_header: Authorization header value
+    '''
     
-    return parse_task_response(results, url, taskId, post_header)
+    response = anaplan_governor.delete(url + "/" + taskId, headers=post_header)
+    if not response.ok:
+        logging.debug("There was an error cancelling task " + taskId + ": " + response.text)
+    
+    return response.ok
     
 #===========================================================================
 # This function reads the JSON results of the completed Anaplan task and returns
@@ -407,7 +1170,7 @@ def parse_task_response(results, url, taskId, post_header):
         return "The task has failed to run due to an error: " + error_message
     else:
         if failure_alert == "True":
-            dump = requests.get(url + "/" + taskId + '/' + "dump", headers=post_header)
+            dump = anaplan_governor.get(url + "/" + taskId + '/' + "dump", headers=post_header)
             dump = dump.text
         success_report = str(results["result"]["successful"])
         if 'details' not in results["result"]:
@@ -424,7 +1187,7 @@ def parse_task_response(results, url, taskId, post_header):
                         details = nestedResults["details"][0]["values"]
                         for i in details:
                             error_detail = error_detail + str(i or '') + '\n' #changed i to str(i or '')
-                        dump = requests.get(url + "/" + taskId + '/' + "dumps" + '/' + object_id,  headers=post_header)
+                        dump = anaplan_governor.get(url + "/" + taskId + '/' + "dumps" + '/' + object_id,  headers=post_header)
                         report = "Error dump for " + object_id + '\n' + dump.text
                         anaplan_process_dump += report  
                         failure_details = failure_details + local_message      
@@ -456,25 +1219,31 @@ def get_list(conn, resource):
     :param resource: The Anaplan model resource to be queried and returned to the user
     '''
     
-    authorization = conn.authorization
-    workspaceGuid = conn.workspaceGuid
-    modelGuid = conn.modelGuid
-    
-    get_header = {
-            'Authorization': authorization,
-            'Content-Type':'application/json'
-    }
-    url = __base_url__ + "/" + workspaceGuid + "/models/" + modelGuid + "/" + resource.lower()
-    
     logging.debug("Fetching " + resource + "...")
     
-    response = requests.get(url, headers=get_header)
-    response = response.text
-    response = json.loads(response)
+    response = list(iter_list(conn, resource))
     
     logging.debug("Finished fetching " + resource + ".")
      
-    return response[resource]
+    return response
+
+#===========================================================================
+# This function yields the desired model resources one at a time, following
+# the API paging. Later pages are fetched ahead while the caller processes
+# the current one, so the first items are available before the whole list
+# has arrived and only a few pages are held in memory.
+#===========================================================================
+def iter_list(conn, resource, page_size=__page_size__, prefetch=2):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param resource: The Anaplan model resource to be queried: files, actions, imports, exports, processes
+    :param page_size: Number of items requested per page
+    :param prefetch: Number of pages fetched ahead of the caller
+    '''
+    
+    url = __base_url__ + "/" + conn.workspaceGuid + "/models/" + conn.modelGuid + "/" + resource.lower()
+    
+    return _iter_pages(conn, url, resource, page_size, prefetch)
 
 #===========================================================================
 # This function reads the JSON response of the Anaplan resources, prints to screen.
@@ -493,13 +1262,22 @@ def parse_get_response(response):
 #===========================================================================
 # This function downloads a file from Anaplan to the specified path.
 #===========================================================================
-def get_file(conn, fileId, location):
+def get_file(conn, fileId, location, cache=None):
     ''' 
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param fileId: ID of the Anaplan file to download
     :param location: Location on the local machine where the download will be saved
+    :param cache: Serve repeat downloads from a local cache: True for ~/.anaplanapi2/files, a directory, or an
+                  anaplan_file_cache.FileCache
     '''
     
+    if cache:
+        path, file_name = _cached_download(conn, fileId, cache)
+        if path is None:
+            return file_name
+        shutil.copyfile(path, location + file_name)
+        return "File successfully downloaded to " + location + file_name
+    
     chunk = 0
     details = get_file_details(conn, fileId)
     chunk_count = details[0]
@@ -520,7 +1298,7 @@ def get_file(conn, fileId, location):
     
     while int(chunk)<int(chunk_count):
         url = __base_url__ + "/" + workspaceGuid + "/models/" + modelGuid + "/files/" + fileId + "/chunks/" + str(chunk)
-        file_contents = requests.get(url, headers=get_header)
+        file_contents = anaplan_governor.get(url, headers=get_header)
         
         if file_contents.ok:
             local_file.write(file_contents.text)
@@ -533,9 +1311,12 @@ def get_file(conn, fileId, location):
     return "File successfully downloaded to " + location + file_name        
 
 #===========================================================================
-# This function downloads a file from Anaplan to a Pandas Dataframe.
+# This function downloads a file from Anaplan to a Pandas Dataframe. With
+# schema_cache, the dtypes and low-cardinality text columns of the file are
+# learned on the first download and saved; later downloads parse every chunk
+# with the saved dtypes and store the repetitive columns as categories.
 #===========================================================================
-def get_file_as_dataframe(conn, fileId, delimiter=",",header_row=0,index_col=None,skiprows=None):
+def get_file_as_dataframe(conn, fileId, delimiter=",",header_row=0,index_col=None,skiprows=None,schema_cache=None,cache=None):
     ''' 
     :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
     :param fileId: ID of the Anaplan file to download
@@ -543,42 +1324,368 @@ def get_file_as_dataframe(conn, fileId, delimiter=",",header_row=0,index_col=Non
     :param header: Row number(s) to use as the column names, and the start of the data
     :param index_col: Column(s) to use as the row labels of the DataFrame, either given as string name or column index
     :param skiprows: Line numbers to skip (0-indexed) or number of lines to skip (int) at the start of the file
+    :param schema_cache: True to cache the learned schema in ~/.anaplanapi2/schemas, or the directory to cache it in
+    :param cache: Serve repeat downloads from a local cache: True for ~/.anaplanapi2/files, a directory, or an
+                  anaplan_file_cache.FileCache
     '''
-    df=pandas.DataFrame()
-    chunk = 0
-    details = get_file_details(conn, fileId)
-    chunk_count = details[0]
-    file_name = details[1]
+    frames=[]
+    
+    schema = None
+    schema_file = None
+    if schema_cache:
+        schema_file = anaplan_schema.schema_path(conn.workspaceGuid, conn.modelGuid, fileId, None if schema_cache is True else schema_cache)
+        schema = anaplan_schema.load(schema_file)
+    dtype = anaplan_schema.read_dtypes(schema) if schema else None
+    
+    if cache:
+        #The cached copy is parsed as a single chunk
+        path, file_name = _cached_download(conn, fileId, cache)
+        if path is None:
+            return file_name
+        sources = [path]
+    else:
+        details = get_file_details(conn, fileId)
+        chunk_count = details[0]
+        logging.debug("Fetching file " + fileId + "...")
+        sources = _download_chunks(conn, fileId, chunk_count)
+    
+    #The download that learns the schema keeps its chunks, in case some of them have to be parsed again
+    learning = []
+    
+    for chunk, file_contents in enumerate(sources):
+        if cache or file_contents.ok:
+            source = file_contents if cache else io.BytesIO(file_contents.content)
+            if schema_cache and schema is None:
+                learning.append(source)
+            if chunk==0:
+                read_args = {"header": header_row}
+            else:
+                read_args = {"header": None, "names": frames[0].columns}
+            try:
+                rawData = pandas.read_csv(source, sep=delimiter, dtype=dtype, **read_args)
+            except (ValueError, TypeError):
+                #The file no longer matches the cached schema, parse without it and learn a new one
+                logging.debug("Cached schema of file " + fileId + " does not match chunk " + str(chunk) + ", relearning.")
+                if not cache:
+                    source.seek(0)
+                rawData = pandas.read_csv(source, sep=delimiter, **read_args)
+                rawData = anaplan_schema.apply(rawData, schema)
+                schema = None
+                dtype = None
+            frames.append(rawData)
+        else:
+            return "There was a problem fetching the file: " + file_contents.text
     
-    authorization = conn.authorization
-    workspaceGuid = conn.workspaceGuid
-    modelGuid = conn.modelGuid
+    if schema is not None:
+        return anaplan_schema.concat(frames, schema)
+    
+    df = pandas.concat(frames, ignore_index=True) if frames else pandas.DataFrame()
+    if schema_cache:
+        schema = anaplan_schema.learn(df)
+        anaplan_schema.save(schema, schema_file)
+        dtype = anaplan_schema.read_dtypes(schema)
+        if len(learning) == len(frames) and any(anaplan_schema.misparsed(frame, schema) for frame in frames):
+            #A text column came out as numbers in some chunk, e.g. 007 as 7; parse the chunks again as text
+            frames = []
+            for source in learning:
+                if not isinstance(source, str):
+                    source.seek(0)
+                read_args = {"header": header_row} if not frames else {"header": None, "names": frames[0].columns}
+                frames.append(pandas.read_csv(source, sep=delimiter, dtype=dtype, **read_args))
+            return anaplan_schema.concat(frames, schema)
+        #Convert to the learned dtypes so the first download matches the later ones, e.g. Int64 rather than int64
+        df = df.astype(dtype)
     
-    get_header = {
-                "Authorization": authorization,
-    }    
+    return df      
     
+
+#===========================================================================
+# This function returns the first rows of an Anaplan file as a Pandas
+# Dataframe. Only as many chunks as are needed to hold the rows are
+# downloaded, usually just the first one.
+#===========================================================================
+def get_file_preview(conn, fileId, rows=100, delimiter=",", header_row=0):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to preview
+    :param rows: Number of data rows to return
+    :param delimiter: Delimiter to use default ,
+    :param header_row: Row number to use as the column names, and the start of the data
+    '''
     
-    logging.debug("Fetching file " + fileId + "...")
+    data = _read_first_lines(conn, fileId, header_row + 1 + rows)
+    if isinstance(data, str):
+        return data
+    if not data:
+        return pandas.DataFrame()
     
-    while int(chunk)<int(chunk_count):
-        url = __base_url__ + "/" + workspaceGuid + "/models/" + modelGuid + "/files/" + fileId + "/chunks/" + str(chunk)
-        file_contents = requests.get(url, headers=get_header)
-        if file_contents.ok:
-            #urlData = file_contents.content
-            #rawData = pandas.read_csv(io.StringIO(urlData.decode('utf-8')))
-            if chunk==0:
-                df = pandas.read_csv(io.StringIO(file_contents.text),header=header_row, sep=delimiter)
-            else:
-                rawData = pandas.read_csv(io.StringIO(file_contents.text),header=None,names=df.columns, sep=delimiter)
-                df=pandas.concat([df,rawData],ignore_index=True)
-        else:
+    return pandas.read_csv(io.BytesIO(data), header=header_row, sep=delimiter, nrows=rows)
+
+#===========================================================================
+# This function returns the column names of an Anaplan file and, optionally,
+# a sample of its first rows, downloading only the chunks needed for them.
+#===========================================================================
+def get_file_header(conn, fileId, sample_rows=0, delimiter=","):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to inspect
+    :param sample_rows: Number of data rows to return with the header
+    :param delimiter: Delimiter to use default ,
+    :returns: Tuple of the list of column names and a list of sample rows, each a list of values
+    '''
+    
+    data = _read_first_lines(conn, fileId, 1 + sample_rows)
+    if isinstance(data, str):
+        return data
+    
+    reader = csv.reader(io.StringIO(data.decode('utf-8', errors='replace')), delimiter=delimiter)
+    lines = [line for _, line in zip(range(1 + sample_rows), reader)]
+    if not lines:
+        return [], []
+    
+    return lines[0], lines[1:]
+
+#===========================================================================
+# This function downloads chunks of an Anaplan file until at least the given
+# number of complete lines has been received, or the file ends, and returns
+# the bytes received. An error message is returned if a chunk fails.
+#===========================================================================
+def _read_first_lines(conn, fileId, lines):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to read
+    :param lines: Number of complete lines required
+    '''
+    
+    chunk_count = get_file_details(conn, fileId)[0]
+    
+    logging.debug("Fetching the first " + str(lines) + " line(s) of file " + fileId + "...")
+    
+    data = []
+    line_count = 0
+    for file_contents in _download_chunks(conn, fileId, chunk_count):
+        if not file_contents.ok:
             return "There was a problem fetching the file: " + file_contents.text
+        data.append(file_contents.content)
+        line_count += file_contents.content.count(b"\n")
+        if line_count >= lines:
             break
-        chunk = str(int(chunk) + 1)
     
-    return df      
+    return b"".join(data)
+
+#===========================================================================
+# This function downloads a file from Anaplan straight into partitioned
+# Parquet files without holding the export in memory. The CSV is parsed
+# incrementally as chunks arrive and every block of rows is written to its
+# own part file, or into hive-style directories when partition_cols is given.
+# The schema is inferred from the first block unless one is supplied, and is
+# then applied to every later block. Requires the pyarrow package.
+#===========================================================================
+def get_file_as_parquet(conn, fileId, directory, schema=None, delimiter=",", partition_cols=None, block_size=__BYTES__ * 16):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to download
+    :param directory: Local directory the Parquet files are written to
+    :param schema: pyarrow.Schema, or dict of column name to pyarrow type, for the columns; inferred if None
+    :param delimiter: Delimiter to use default ,
+    :param partition_cols: List of columns to partition the files by, e.g. ["Region"]
+    :param block_size: Number of bytes of CSV parsed into each block of rows
+    '''
+    
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        return "The pyarrow package is required to download files as Parquet."
+    
+    chunk_count = get_file_details(conn, fileId)[0]
     
+    column_types = None
+    if schema is not None:
+        column_types = {field.name: field.type for field in schema} if isinstance(schema, pyarrow.Schema) else schema
+    
+    #Part files from an earlier run would be mixed into the output, so only an empty directory is written to
+    if os.path.isdir(directory) and os.listdir(directory):
+        return "The directory " + directory + " is not empty, please choose an empty or new directory."
+    
+    logging.debug("Fetching file " + fileId + " as Parquet...")
+    
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    rows = 0
+    read_options = pyarrow.csv.ReadOptions(block_size=block_size)
+    parse_options = pyarrow.csv.ParseOptions(delimiter=delimiter)
+    try:
+        stream = _ChunkReader(_download_chunks(conn, fileId, chunk_count))
+        
+        #pyarrow fixes the column types from the first block, so a column that is empty there would be typed
+        #null and fail on its first value later on: infer the first block up front and read those as strings
+        head = stream.peek(block_size)
+        sample = pyarrow.csv.read_csv(io.BytesIO(head[:head.rfind(b"\n") + 1] or head), read_options=read_options,
+                                      parse_options=parse_options,
+                                      convert_options=pyarrow.csv.ConvertOptions(column_types=column_types))
+        column_types = dict(column_types or {})
+        for field in sample.schema:
+            if pyarrow.types.is_null(field.type) and field.name not in column_types:
+                column_types[field.name] = pyarrow.string()
+        
+        reader = pyarrow.csv.open_csv(io.BufferedReader(stream, __BYTES__), read_options=read_options,
+                                      parse_options=parse_options,
+                                      convert_options=pyarrow.csv.ConvertOptions(column_types=column_types))
+        for batch in reader:
+            table = pyarrow.Table.from_batches([batch])
+            if partition_cols:
+                pyarrow.parquet.write_to_dataset(table, directory, partition_cols=partition_cols,
+                                                 basename_template="part-" + str(len(files)).zfill(5) + "-{i}.parquet")
+                files.append(directory)
+            else:
+                path = os.path.join(directory, "part-" + str(len(files)).zfill(5) + ".parquet")
+                pyarrow.parquet.write_table(table, path)
+                files.append(path)
+            rows += batch.num_rows
+    except (IOError, pyarrow.ArrowInvalid) as e:
+        #The directory was empty when the download started, remove the partial output
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        return "There was a problem fetching the file: " + str(e)
+    
+    return "File successfully downloaded to " + directory + ", " + str(rows) + " row(s) in " + str(len(files)) + " part(s)."
+
+#===========================================================================
+# Read-only stream over the chunks of an Anaplan file download, so parsers
+# can pull data incrementally. A failed chunk request raises IOError.
+#===========================================================================
+class _ChunkReader(io.RawIOBase):
+    '''
+    Stream over the responses yielded by _download_chunks
+    '''
+    
+    def __init__(self, responses):
+        '''
+        :param responses: Iterator of chunk responses from _download_chunks
+        '''
+        
+        self.responses = responses
+        self.buffer = memoryview(b"")
+    
+    def readable(self):
+        return True
+    
+    #===========================================================================
+    # This function returns up to size bytes from the start of the stream
+    # without consuming them, downloading further chunks as needed.
+    #===========================================================================
+    def peek(self, size):
+        parts = [self.buffer.tobytes()]
+        length = len(self.buffer)
+        while length < size:
+            response = next(self.responses, None)
+            if response is None:
+                break
+            if not response.ok:
+                raise IOError(response.text)
+            parts.append(response.content)
+            length += len(response.content)
+        self.buffer = memoryview(b"".join(parts))
+        return self.buffer[:size].tobytes()
+    
+    def readinto(self, b):
+        while not self.buffer:
+            response = next(self.responses, None)
+            if response is None:
+                return 0
+            if not response.ok:
+                raise IOError(response.text)
+            self.buffer = memoryview(response.content)
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+#===========================================================================
+# This function downloads a file from Anaplan once and passes every chunk to
+# each of the sinks in anaplan_sinks (file, compressed file, DataFrame, digest,
+# callback), so one download can serve several consumers. The results of the
+# sinks are returned in the order the sinks were given.
+#===========================================================================
+def get_file_multi(conn, fileId, sinks):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to download
+    :param sinks: List of anaplan_sinks.Sink objects that receive each chunk
+    '''
+    
+    chunk_count = get_file_details(conn, fileId)[0]
+    
+    logging.debug("Fetching file " + fileId + "...")
+    
+    try:
+        for file_contents in _download_chunks(conn, fileId, chunk_count):
+            if not file_contents.ok:
+                _abort_sinks(sinks)
+                return "There was a problem fetching the file: " + file_contents.text
+            for sink in sinks:
+                sink.write(file_contents.content)
+    except BaseException:
+        _abort_sinks(sinks)
+        raise
+    
+    #Every sink is closed even if an earlier one fails, the first error is raised afterwards
+    results = []
+    error = None
+    for sink in sinks:
+        try:
+            results.append(sink.close())
+        except Exception as e:
+            results.append(None)
+            error = error or e
+    if error is not None:
+        raise error
+    
+    return results
+
+#===========================================================================
+# This function releases the sinks of a failed download without producing
+# their results.
+#===========================================================================
+def _abort_sinks(sinks):
+    '''
+    :param sinks: List of anaplan_sinks.Sink objects
+    '''
+    
+    for sink in sinks:
+        try:
+            sink.abort()
+        except Exception as e:
+            logging.debug("There was an error releasing a download sink: " + str(e))
+
+#===========================================================================
+# This function GETs the chunks of an Anaplan file in order and yields each
+# response. It stops after the first failed request.
+#===========================================================================
+def _download_chunks(conn, fileId, chunk_count, first_chunk=0):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to download
+    :param chunk_count: Number of chunks in the file
+    :param first_chunk: Number of the first chunk to fetch
+    '''
+    
+    get_header = {
+                "Authorization": conn.authorization,
+    }
+    url = __base_url__ + "/" + conn.workspaceGuid + "/models/" + conn.modelGuid + "/files/" + fileId + "/chunks/"
+    
+    for chunk in range(int(first_chunk), int(chunk_count)):
+        file_contents = anaplan_governor.get(url + str(chunk), headers=get_header)
+        yield file_contents
+        if not file_contents.ok:
+            return
 
 #===============================================================================
 # This function queries the model for name and chunk count of a specified file
@@ -589,31 +1696,77 @@ def get_file_details(conn, fileId):
     :param fileId: ID of the Anaplan file to download
     '''
     
-    chunkCount = 0
-    file_name = ""
+    item = _get_file_metadata(conn, fileId)
+    if item is None:
+        return [0, ""]
     
-    authorization = conn.authorization
-    workspaceGuid = conn.workspaceGuid
-    modelGuid = conn.modelGuid
+    return [item["chunkCount"], str(item["name"])]
+
+#===============================================================================
+# This function returns the entry of a file in the model's file listing, or
+# None if the listing fails or does not contain the file.
+#===============================================================================
+def _get_file_metadata(conn, fileId):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file
+    '''
     
     get_header = {
-                "Authorization": authorization,
+                "Authorization": conn.authorization,
     }    
     
-    url = __base_url__ + "/" + workspaceGuid + "/models/" + modelGuid + "/files/"
-    files_list = requests.get(url, headers=get_header)
+    url = __base_url__ + "/" + conn.workspaceGuid + "/models/" + conn.modelGuid + "/files/"
+    files_list = anaplan_governor.get(url, headers=get_header)
     
     if files_list.ok:
-        files=json.loads(files_list.text)
-        files=files["files"]
-        for item in files:
-            temp_id=str(item["id"])
-            chunkCount=item["chunkCount"]
-            file_name=str(item["name"])
-            if temp_id == fileId:
-                break
+        for item in anaplan_json.response_json(files_list)["files"]:
+            if str(item["id"]) == fileId:
+                return item
+    
+    return None
+
+#===============================================================================
+# This function returns the path of an up to date copy of a file in the local
+# cache, downloading it on a miss. The cached copy is revalidated with a single
+# listing call: any change to the file's listing entry, such as its chunk
+# count, changes the cache key. Returns (path, file name), or (None, error).
+#===============================================================================
+def _cached_download(conn, fileId, cache):
+    '''
+    :param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    :param fileId: ID of the Anaplan file to download
+    :param cache: True for ~/.anaplanapi2/files, a directory, or an anaplan_file_cache.FileCache
+    '''
     
-    return [chunkCount, file_name]
+    if not isinstance(cache, anaplan_file_cache.FileCache):
+        cache = anaplan_file_cache.FileCache(None if cache is True else cache)
+    
+    item = _get_file_metadata(conn, fileId)
+    if item is None:
+        return None, "There was a problem fetching the file: " + fileId + " was not found in the model."
+    
+    key = anaplan_file_cache.key(conn.workspaceGuid, conn.modelGuid, fileId, item)
+    path = cache.get(key)
+    if path is not None:
+        logging.debug("Serving file " + fileId + " from the local cache.")
+        return path, str(item["name"])
+    
+    logging.debug("Fetching file " + fileId + "...")
+    failed = []
+    def contents():
+        for file_contents in _download_chunks(conn, fileId, item["chunkCount"]):
+            if not file_contents.ok:
+                failed.append(file_contents.text)
+                yield None
+                return
+            yield file_contents.content
+    
+    path = cache.put(key, contents())
+    if path is None:
+        return None, "There was a problem fetching the file: " + failed[0]
+    
+    return path, str(item["name"])
 
 #===============================================================================
 # This function returns the user's Anaplan ID
@@ -633,8 +1786,8 @@ def get_user_id(conn):
     
     logging.debug("Fetching user ID...")
     
-    user_details=requests.get(url, headers=get_header)
-    user_details=json.loads(user_details.text)
+    user_details=anaplan_governor.get(url, headers=get_header)
+    user_details=anaplan_json.response_json(user_details)
     
     user_id=user_details["user"]["id"]
     
@@ -652,21 +1805,9 @@ def get_models(conn, user_id):
     @param user_id: 32-character string that uniquely identifies the Anaplan user
     '''
     
-    url="https://api.anaplan.com/2/0/users/" + str(user_id) + "/models"
-    
-    authorization = conn.authorization
-
-    get_header = {
-                "Authorization": authorization , 
-                "Content-Type":"application/json"
-                }
-    
     logging.debug("Fetching models...")
     
-    model_list=requests.get(url, headers=get_header)
-    model_list=json.loads(model_list.text)
-    
-    model_list=model_list["models"]
+    model_list=list(iter_models(conn, user_id))
     
     logging.debug("Finished fetching models.")
     
@@ -682,26 +1823,98 @@ def get_workspaces(conn, user_id):
     @param user_id: 32-character string that uniquely identifies the Anaplan user
     '''
     
-    url="https://api.anaplan.com/2/0/users/" + str(user_id) + "/workspaces"
-    
-    authorization = conn.authorization
-
-    get_header = {
-                "Authorization": authorization ,
-                "Content-Type":"application/json"
-                }
-    
     logging.debug("Fetching workspaces...")
     
-    workspace_list=requests.get(url, headers=get_header)
-    workspace_list=json.loads(workspace_list.text)
-    
-    model_list=workspace_list["workspaces"]
+    model_list=list(iter_workspaces(conn, user_id))
     
     logging.debug("Finished fetching workspaces.")
     
     return model_list
     
+#===============================================================================
+# This function yields the models the designated user has access to, one at a
+# time, following the API paging.
+#===============================================================================
+def iter_models(conn, user_id, page_size=__page_size__, prefetch=2):
+    '''
+    @param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    @param user_id: 32-character string that uniquely identifies the Anaplan user
+    @param page_size: Number of models requested per page
+    @param prefetch: Number of pages fetched ahead of the caller
+    '''
+    
+    url="https://api.anaplan.com/2/0/users/" + str(user_id) + "/models"
+    
+    return _iter_pages(conn, url, "models", page_size, prefetch)
+
+#===============================================================================
+# This function yields the workspaces the designated user has access to, one
+# at a time, following the API paging.
+#===============================================================================
+def iter_workspaces(conn, user_id, page_size=__page_size__, prefetch=2):
+    '''
+    @param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    @param user_id: 32-character string that uniquely identifies the Anaplan user
+    @param page_size: Number of workspaces requested per page
+    @param prefetch: Number of pages fetched ahead of the caller
+    '''
+    
+    url="https://api.anaplan.com/2/0/users/" + str(user_id) + "/workspaces"
+    
+    return _iter_pages(conn, url, "workspaces", page_size, prefetch)
+
+#===============================================================================
+# This function pages through an Anaplan list endpoint using the limit and
+# offset parameters. The first page tells the total size from its paging
+# metadata; the remaining pages are then requested up to prefetch at a time
+# and their items yielded in order as each page is parsed. Endpoints that
+# return no paging metadata are treated as a single page.
+#===============================================================================
+def _iter_pages(conn, url, key, page_size, prefetch):
+    '''
+    @param conn: AnaplanConnection object which contains authorization string, workspace ID, and model ID
+    @param url: URL of the list endpoint
+    @param key: Key of the item list in the response body
+    @param page_size: Number of items requested per page
+    @param prefetch: Number of pages fetched ahead of the caller
+    '''
+    
+    get_header = {
+                "Authorization": conn.authorization,
+                "Content-Type":"application/json"
+                }
+    
+    def fetch(offset):
+        response = anaplan_governor.get(url, headers=get_header, params={"limit": page_size, "offset": offset})
+        response.raise_for_status()
+        return anaplan_json.response_json(response)
+    
+    page = fetch(0)
+    items = page.get(key, [])
+    for item in items:
+        yield item
+    
+    paging = page.get("meta", {}).get("paging", {})
+    total_size = paging.get("totalSize")
+    if total_size is None or not items or len(items) >= total_size:
+        return
+    
+    #Step by the size of the first page in case the server caps the page size below page_size
+    offsets = iter(range(len(items), total_size, len(items)))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as pool:
+        for offset in offsets:
+            pending.append(pool.submit(contextvars.copy_context().run, fetch, offset))
+            if len(pending) >= max(prefetch, 1):
+                break
+        while pending:
+            page = pending.popleft().result()
+            for offset in offsets:
+                pending.append(pool.submit(contextvars.copy_context().run, fetch, offset))
+                break
+            for item in page.get(key, []):
+                yield item
+
 #===============================================================================
 # This function returns the action id based on the action name
 #===============================================================================
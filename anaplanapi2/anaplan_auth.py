@@ -22,8 +22,9 @@ from cryptography.hazmat.primitives.asymmetric import utils
 
 from base64 import b64encode
 import requests
-import json
 import os
+import time
+from anaplanapi2 import anaplan_json
 #import jks
 
 #===============================================================================
@@ -128,9 +129,9 @@ def generate_post_data(privKey):
 	unsigned_nonce=create_nonce()
 	
 	signed_nonce=str(sign_string(unsigned_nonce, privKey))
-	json_string='{ "encodedData":"' + str(b64encode(unsigned_nonce).decode('utf-8')) + '", "encodedSignedData":"' + signed_nonce + '"}'
+	post_data={ "encodedData":b64encode(unsigned_nonce).decode('utf-8'), "encodedSignedData":signed_nonce }
 
-	return json_string
+	return post_data
 
 #===========================================================================
 # This function reads a user's public certificate as a string, base64 
@@ -171,7 +172,7 @@ def basic_auth_header(username, password):
 def auth_request(header, body):	
 	'''
 	:param header: Authorization type, CACertificate or Basic
-	:param body: POST request body: encodedData (150-character nonce), encodedSignedData (encodedData value signed by private key)
+	:param body: POST request body dict: encodedData (150-character nonce), encodedSignedData (encodedData value signed by private key)
 	'''
 	
 	anaplan_url='https://auth.anaplan.com/token/authenticate'
@@ -179,7 +180,7 @@ def auth_request(header, body):
 	if body == None:
 		r=requests.post(anaplan_url, headers=header)
 	else:	
-		r=requests.post(anaplan_url, headers=header, data=json.dumps(body))
+		r=requests.post(anaplan_url, headers=header, data=anaplan_json.dumps(body))
 
 	#Return the 	JSON array containing the authentication response, including AnaplanAuthToken
 	return r.text
@@ -197,7 +198,7 @@ def verify_auth(token):
 	
 	r=requests.get(anaplan_url, headers=header)
 	
-	status=json.loads(r.text)
+	status=anaplan_json.response_json(r)
 	
 	return status["statusMessage"]
 
@@ -212,7 +213,7 @@ def authenticate(response):
 	:param response: JSON array of authentication request
 	'''
 	
-	json_response = json.loads(response)
+	json_response = anaplan_json.loads(response)
 	#Check that the request was successful, is so extract the AnaplanAuthToken value 
 	if not json_response["status"] == "FAILURE_BAD_CREDENTIAL":
 		token = json_response["tokenInfo"]["tokenValue"]
@@ -225,6 +226,22 @@ def authenticate(response):
 		status = "Error: " + json_response["statusMessage"]
 		return status
 
+#===========================================================================
+# This function reads the expiry of the token in the JSON response of the
+# Anaplan authentication request and returns it as epoch seconds. Tokens
+# are valid for 35 minutes, which is assumed if the response has no expiry.
+#===========================================================================
+def token_expiry(response):	
+	'''
+	:param response: JSON array of authentication request
+	'''
+	
+	json_response = anaplan_json.loads(response)
+	try:
+		return json_response["tokenInfo"]["expiresAt"] / 1000.0
+	except (KeyError, TypeError):
+		return time.time() + 35 * 60
+
 #===========================================================================
 # This function takes in the current token value, refreshes, and returns the
 # updated token Authorization header value.
@@ -238,6 +255,6 @@ def refresh_token(token):
 	header={ "Authorization" : "AnaplanAuthToken " + token }
 	r = requests.post(url, headers=header)
 	
-	new_token=json.loads(r.text)["tokenInfo"]["tokenValue"]
+	new_token=anaplan_json.response_json(r)["tokenInfo"]["tokenValue"]
 	
 	return "AnaplanAuthToken " + new_token
\ No newline at end of file
@@ -0,0 +1,148 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Size-bounded local cache of downloaded Anaplan files. Entries
+#                 are keyed by workspace, model, file ID and the metadata the
+#                 file listing returns for the file, so a cached copy is only
+#                 served while the listing still describes the same file. The
+#                 least recently used entries are evicted once the cache grows
+#                 beyond its size limit.
+# Input:          Cache key, chunks of a downloaded file
+# Output:         Path of the cached copy
+#===============================================================================
+
+import hashlib
+import json
+import os
+import threading
+import time
+from anaplanapi2.anaplan_token_cache import file_lock
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__cache_dir__ = os.path.join(os.path.expanduser("~"), ".anaplanapi2", "files")
+
+class FileCache(object):
+    '''
+    LRU cache of downloaded files on local disk
+    '''
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3, max_age=900):
+        '''
+        :param directory: Directory holding the cached files, defaults to ~/.anaplanapi2/files
+        :param max_bytes: Total size of the cached files before the least recently used are evicted
+        :param max_age: Seconds a cached copy is served for, None to rely on the listing metadata alone. Exports
+                        re-run with the same chunk count look unchanged in the listing, so keep this short for them.
+        '''
+
+        self.directory = directory or __cache_dir__
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(self.directory, "index.json")
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    #===========================================================================
+    # This function returns the path of the cached copy for key, or None if
+    # there is none or it has expired. A hit marks the entry as recently used.
+    #===========================================================================
+    def get(self, key):
+        '''
+        :param key: Cache key, see key()
+        '''
+
+        with file_lock(self.index_path):
+            index = self._read()
+            entry = index.get(key)
+            path = os.path.join(self.directory, key)
+            if entry is None or not os.path.exists(path):
+                return None
+            if self.max_age is not None and time.time() - entry["created"] > self.max_age:
+                return None
+            entry["used"] = time.time()
+            self._write(index)
+
+        return path
+
+    #===========================================================================
+    # This function stores a file from an iterable of byte chunks and returns
+    # the path of the cached copy. The copy is written under a temporary name
+    # first, so readers never see a partial file. A None chunk marks a failed
+    # download: nothing is cached and None is returned.
+    #===========================================================================
+    def put(self, key, chunks):
+        '''
+        :param key: Cache key, see key()
+        :param chunks: Iterable of bytes making up the file
+        '''
+
+        path = os.path.join(self.directory, key)
+        temp_path = path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        size = 0
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in chunks:
+                    if chunk is None:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+                else:
+                    chunk = b""
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        if chunk is None:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, path)
+
+        with file_lock(self.index_path):
+            index = self._read()
+            now = time.time()
+            index[key] = {"size": size, "created": now, "used": now}
+            self._evict(index, key)
+            self._write(index)
+
+        return path
+
+    def _evict(self, index, keep):
+        total = sum(entry["size"] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= index.pop(key)["size"]
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except OSError:
+                pass
+
+    def _read(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, index):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+
+#===========================================================================
+# This function builds the cache key of a file from its model and the file
+# listing entry (name, chunk count and any other metadata the API returns).
+#===========================================================================
+def key(workspaceGuid, modelGuid, fileId, file_metadata):
+    '''
+    :param workspaceGuid: ID of the Anaplan workspace
+    :param modelGuid: ID of the Anaplan model
+    :param fileId: ID of the Anaplan file
+    :param file_metadata: Entry of the file in the model's file listing
+    '''
+
+    value = json.dumps([workspaceGuid, modelGuid, fileId, file_metadata], sort_keys=True)
+
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
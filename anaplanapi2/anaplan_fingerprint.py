@@ -0,0 +1,124 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    This library fingerprints the rows of a DataFrame so that only
+#                 inserted or changed rows need to be uploaded to Anaplan. The
+#                 fingerprints of the last successful upload to a file are kept
+#                 in a local index and compared against on the next upload.
+# Input:          Pandas DataFrame, key column(s), path to the fingerprint index
+# Output:         Rows to upload, deleted keys, updated fingerprint index
+#===============================================================================
+
+import os
+import pandas
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__index_dir__ = os.path.join(os.path.expanduser("~"), ".anaplanapi2", "fingerprints")
+__key_hash__ = "__key_hash__"
+__row_hash__ = "__row_hash__"
+
+#===========================================================================
+# This function returns the path of the fingerprint index for a file in a model.
+#===========================================================================
+def index_path(workspaceGuid, modelGuid, fileId, index_dir=None):
+    '''
+    :param workspaceGuid: ID of the Anaplan workspace
+    :param modelGuid: ID of the Anaplan model
+    :param fileId: ID of the file in the Anaplan model
+    :param index_dir: Directory holding the fingerprint indexes, defaults to ~/.anaplanapi2/fingerprints
+    '''
+
+    if index_dir is None:
+        index_dir = __index_dir__
+
+    return os.path.join(index_dir, workspaceGuid + "_" + modelGuid + "_" + fileId + ".pkl")
+
+#===========================================================================
+# This function hashes every row of the DataFrame, and the key columns of
+# every row, in a single vectorized pass each. The result holds the key
+# column values alongside both hashes so deleted keys can be reported later.
+# Raises ValueError if the key does not uniquely identify every row, as rows
+# sharing a key could not be told apart on the next upload.
+#===========================================================================
+def fingerprint(df, key):
+    '''
+    :param df: DataFrame to fingerprint
+    :param key: Column name, or list of column names, that uniquely identifies a row
+    '''
+
+    if isinstance(key, str):
+        key = [key]
+
+    duplicated = df.duplicated(key)
+    if duplicated.any():
+        raise ValueError("Key " + str(key) + " is not unique, " + str(int(duplicated.sum())) + " row(s) repeat an earlier key.")
+
+    index = df[key].reset_index(drop=True)
+    index[__key_hash__] = pandas.util.hash_pandas_object(df[key], index=False).values
+    index[__row_hash__] = pandas.util.hash_pandas_object(df, index=False).values
+
+    return index
+
+#===========================================================================
+# This function reads the fingerprint index of the previous upload. If no
+# index exists yet, None is returned and every row is treated as inserted.
+#===========================================================================
+def load_index(path):
+    '''
+    :param path: Path to the fingerprint index
+    '''
+
+    if not os.path.exists(path):
+        return None
+
+    return pandas.read_pickle(path)
+
+#===========================================================================
+# This function persists the fingerprint index. The index is written to a
+# temporary file first so an interrupted write never corrupts the last good
+# index.
+#===========================================================================
+def save_index(index, path):
+    '''
+    :param index: Fingerprint index returned by fingerprint()
+    :param path: Path to the fingerprint index
+    '''
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = path + ".tmp"
+    index.to_pickle(temp_path)
+    os.replace(temp_path, path)
+
+#===========================================================================
+# This function compares the current fingerprint against the previous index
+# and returns boolean masks of inserted and changed rows, along with the key
+# values of rows that no longer exist.
+#===========================================================================
+def compare(current, previous, key):
+    '''
+    :param current: Fingerprint index of the DataFrame being uploaded
+    :param previous: Fingerprint index of the previous upload, or None
+    :param key: Column name, or list of column names, that uniquely identifies a row
+    '''
+
+    if isinstance(key, str):
+        key = [key]
+
+    if previous is None:
+        inserted = pandas.Series(True, index=current.index)
+        changed = pandas.Series(False, index=current.index)
+        deleted = current[key].iloc[0:0]
+        return inserted, changed, deleted
+
+    #A row is unchanged when its full-row hash was already present; a key is new when its key hash was not
+    unchanged = current[__row_hash__].isin(previous[__row_hash__])
+    inserted = ~current[__key_hash__].isin(previous[__key_hash__])
+    changed = ~unchanged & ~inserted
+    deleted = previous.loc[~previous[__key_hash__].isin(current[__key_hash__]), key].reset_index(drop=True)
+
+    return inserted, changed, deleted
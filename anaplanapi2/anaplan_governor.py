@@ -0,0 +1,230 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Process-wide governor for the HTTP requests sent to the Anaplan
+#                 API. Once configured, every request first takes tokens from a
+#                 requests-per-second bucket and a bytes-per-second bucket, so
+#                 concurrent uploads, downloads and pollers share the quota
+#                 instead of triggering throttling. Waiting requests are served
+#                 by priority class, then in arrival order.
+# Input:          Rate limits, priority class of the calling code
+# Output:         requests.Response objects
+#===============================================================================
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import threading
+import time
+import requests
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+__governor__ = None
+__priority__ = contextvars.ContextVar("anaplan_priority", default=NORMAL)
+
+class TokenBucket(object):
+    '''
+    Token bucket refilled continuously at rate tokens per second up to capacity
+    '''
+
+    def __init__(self, rate, capacity):
+        '''
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens held, i.e. the largest burst
+        '''
+
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    #===========================================================================
+    # This function returns the number of seconds until amount tokens are
+    # available. Amounts larger than the bucket only wait for a full bucket and
+    # leave it in debt, so large chunks are never starved. An amount of 0
+    # waits until any debt has been repaid.
+    #===========================================================================
+    def delay(self, amount):
+        '''
+        :param amount: Number of tokens required
+        '''
+
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0
+
+        return (needed - self.tokens) / self.rate
+
+class Governor(object):
+    '''
+    Shared request and bandwidth limits for every transfer in the process
+    '''
+
+    def __init__(self, bytes_per_second=None, requests_per_second=None, burst_seconds=1.0):
+        '''
+        :param bytes_per_second: Maximum bandwidth across all requests, None for no limit
+        :param requests_per_second: Maximum request rate across all requests, None for no limit
+        :param burst_seconds: Size of each bucket, in seconds of its rate
+        '''
+
+        self.bytes = TokenBucket(bytes_per_second, bytes_per_second * burst_seconds) if bytes_per_second else None
+        self.requests = TokenBucket(requests_per_second, max(requests_per_second * burst_seconds, 1)) if requests_per_second else None
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    #===========================================================================
+    # This function blocks until a request of nbytes may be sent. Only the
+    # first waiter in priority order may take tokens, so a waiting interactive
+    # request is always served before any bulk transfer.
+    #===========================================================================
+    def acquire(self, nbytes=0, priority=NORMAL):
+        '''
+        :param nbytes: Size of the request body in bytes
+        :param priority: INTERACTIVE, NORMAL or BULK
+        '''
+
+        with self.condition:
+            ticket = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, ticket)
+            self.condition.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if self.waiting[0] == ticket:
+                        timeout = self._delay(nbytes)
+                        if timeout <= 0:
+                            self._take(nbytes)
+                            return
+                    self.condition.wait(timeout)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    #===========================================================================
+    # This function charges bytes received in a response against the bandwidth
+    # limit. The bucket may go into debt, delaying the requests that follow.
+    #===========================================================================
+    def charge(self, nbytes):
+        '''
+        :param nbytes: Size of the response body in bytes
+        '''
+
+        if self.bytes is None or nbytes <= 0:
+            return
+
+        with self.condition:
+            self.bytes.refill(time.monotonic())
+            self.bytes.tokens -= nbytes
+
+    def _delay(self, nbytes):
+        now = time.monotonic()
+        delay = 0
+        if self.requests is not None:
+            self.requests.refill(now)
+            delay = max(delay, self.requests.delay(1))
+        if self.bytes is not None:
+            #Requests without a body still wait while downloads have the bucket in debt
+            self.bytes.refill(now)
+            delay = max(delay, self.bytes.delay(nbytes))
+
+        return delay
+
+    def _take(self, nbytes):
+        if self.requests is not None:
+            self.requests.tokens -= 1
+        if self.bytes is not None:
+            self.bytes.tokens -= nbytes
+
+#===========================================================================
+# This function sets the process-wide limits used by every request made
+# through this module. Calling it with no limits removes the governor.
+#===========================================================================
+def configure(bytes_per_second=None, requests_per_second=None, burst_seconds=1.0):
+    '''
+    :param bytes_per_second: Maximum bandwidth across all requests, None for no limit
+    :param requests_per_second: Maximum request rate across all requests, None for no limit
+    :param burst_seconds: Size of each bucket, in seconds of its rate
+    '''
+
+    global __governor__
+    if bytes_per_second or requests_per_second:
+        __governor__ = Governor(bytes_per_second, requests_per_second, burst_seconds)
+    else:
+        __governor__ = None
+
+    return __governor__
+
+#===========================================================================
+# This function sets the priority class of the requests made by the code it
+# wraps, e.g. with priority(INTERACTIVE): get_file(...). The class follows
+# the work into the worker threads started by the library.
+#===========================================================================
+@contextlib.contextmanager
+def priority(level):
+    '''
+    :param level: INTERACTIVE, NORMAL or BULK
+    '''
+
+    token = __priority__.set(level)
+    try:
+        yield
+    finally:
+        __priority__.reset(token)
+
+#===========================================================================
+# This function sends an HTTP request through the governor, if one is
+# configured, and returns the requests.Response.
+#===========================================================================
+def request(method, url, **kwargs):
+    '''
+    :param method: HTTP method
+    :param url: Request URL
+    :param kwargs: Keyword arguments passed to requests.request
+    '''
+
+    governor = __governor__
+    if governor is None:
+        return requests.request(method, url, **kwargs)
+
+    governor.acquire(_body_size(kwargs), __priority__.get())
+    response = requests.request(method, url, **kwargs)
+    governor.charge(len(response.content))
+
+    return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+def _body_size(kwargs):
+    data = kwargs.get("data")
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    if kwargs.get("json") is not None:
+        return len(json.dumps(kwargs["json"]))
+
+    return 0
@@ -0,0 +1,90 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Local journal of Anaplan tasks that are still running. A task
+#                 is recorded as soon as it is created and removed once its
+#                 results have been collected, so after a restart the remaining
+#                 entries are the tasks whose monitoring can be resumed.
+# Input:          Path to the journal, task details
+# Output:         Journal entries
+#===============================================================================
+
+import json
+import os
+import time
+from anaplanapi2.anaplan_token_cache import file_lock
+
+#===========================================================================
+# This function records a running task.
+#===========================================================================
+def record(path, url, taskId, actionId, workspaceGuid, modelGuid):
+    '''
+    :param path: Path to the journal file
+    :param url: Anaplan task URL
+    :param taskId: ID of the Anaplan task executed
+    :param actionId: ID of the action in the Anaplan model
+    :param workspaceGuid: ID of the Anaplan workspace
+    :param modelGuid: ID of the Anaplan model
+    '''
+
+    entry = {"url": url, "taskId": taskId, "actionId": actionId, "workspaceGuid": workspaceGuid,
+             "modelGuid": modelGuid, "started": time.time()}
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with file_lock(path):
+        tasks = _read(path)
+        tasks.append(entry)
+        _write(path, tasks)
+
+#===========================================================================
+# This function removes a task whose results have been collected.
+#===========================================================================
+def remove(path, taskId):
+    '''
+    :param path: Path to the journal file
+    :param taskId: ID of the Anaplan task
+    '''
+
+    if not os.path.exists(path):
+        return
+
+    with file_lock(path):
+        tasks = _read(path)
+        _write(path, [entry for entry in tasks if entry["taskId"] != taskId])
+
+#===========================================================================
+# This function returns the tasks recorded in the journal, optionally only
+# those of one model.
+#===========================================================================
+def entries(path, workspaceGuid=None, modelGuid=None):
+    '''
+    :param path: Path to the journal file
+    :param workspaceGuid: ID of the Anaplan workspace to filter on
+    :param modelGuid: ID of the Anaplan model to filter on
+    '''
+
+    if not os.path.exists(path):
+        return []
+
+    with file_lock(path):
+        tasks = _read(path)
+
+    return [entry for entry in tasks
+            if (workspaceGuid is None or entry["workspaceGuid"] == workspaceGuid)
+            and (modelGuid is None or entry["modelGuid"] == modelGuid)]
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return []
+
+def _write(path, tasks):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(tasks, f)
+    os.replace(temp_path, path)
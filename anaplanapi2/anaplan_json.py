@@ -0,0 +1,58 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    JSON codec used for every Anaplan API request and response.
+#                 Responses are parsed straight from the response bytes and
+#                 request bodies are serialized to bytes. orjson is used when it
+#                 is installed, otherwise the standard library json module.
+# Input:          Response bytes, or a Python object to send
+# Output:         Parsed Python object, or the serialized request body
+#===============================================================================
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__backend__ = "orjson" if orjson is not None else "json"
+
+#===========================================================================
+# This function parses a JSON document from bytes or a string.
+#===========================================================================
+def loads(data):
+    '''
+    :param data: JSON document, typically response.content
+    '''
+
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+#===========================================================================
+# This function serializes a Python object to JSON bytes for a request body.
+#===========================================================================
+def dumps(obj):
+    '''
+    :param obj: Python object to serialize
+    '''
+
+    if orjson is not None:
+        return orjson.dumps(obj)
+
+    return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+#===========================================================================
+# This function parses the body of a requests.Response.
+#===========================================================================
+def response_json(response):
+    '''
+    :param response: requests.Response object
+    '''
+
+    return loads(response.content)
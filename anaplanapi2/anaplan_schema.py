@@ -0,0 +1,164 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Learned DataFrame schemas for Anaplan file downloads. The first
+#                 download of a file records the dtype of every column and which
+#                 text columns have few distinct values, such as list members;
+#                 later downloads parse every chunk with those dtypes and store
+#                 the repetitive columns as pandas categoricals.
+# Input:          Pandas DataFrame, path to the schema file
+# Output:         Schema dict, dtype arguments for pandas.read_csv
+#===============================================================================
+
+import json
+import os
+import pandas
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__schema_dir__ = os.path.join(os.path.expanduser("~"), ".anaplanapi2", "schemas")
+__max_category_ratio__ = 0.5
+
+#===========================================================================
+# This function returns the path of the schema for a file in a model.
+#===========================================================================
+def schema_path(workspaceGuid, modelGuid, fileId, schema_dir=None):
+    '''
+    :param workspaceGuid: ID of the Anaplan workspace
+    :param modelGuid: ID of the Anaplan model
+    :param fileId: ID of the file in the Anaplan model
+    :param schema_dir: Directory holding the schemas, defaults to ~/.anaplanapi2/schemas
+    '''
+
+    if schema_dir is None:
+        schema_dir = __schema_dir__
+
+    return os.path.join(schema_dir, workspaceGuid + "_" + modelGuid + "_" + fileId + ".json")
+
+#===========================================================================
+# This function learns the schema of a DataFrame. Text columns whose number
+# of distinct values is at most max_category_ratio of the rows become
+# categories and the other text columns are read as text, so codes such as
+# 007 keep their leading zeros. Integer columns are recorded as nullable
+# integers so a later chunk with blank cells still parses.
+#===========================================================================
+def learn(df, max_category_ratio=__max_category_ratio__):
+    '''
+    :param df: DataFrame parsed from the first download
+    :param max_category_ratio: Largest ratio of distinct values to rows for a text column to become a category
+    '''
+
+    dtypes = {}
+    categories = []
+    rows = max(len(df.index), 1)
+
+    for column in df.columns:
+        dtype = df[column].dtype
+        if pandas.api.types.is_bool_dtype(dtype):
+            dtypes[str(column)] = "boolean"
+        elif pandas.api.types.is_integer_dtype(dtype):
+            dtypes[str(column)] = "Int64"
+        elif pandas.api.types.is_float_dtype(dtype):
+            dtypes[str(column)] = "float64"
+        elif isinstance(dtype, pandas.CategoricalDtype) or df[column].nunique(dropna=True) <= rows * max_category_ratio:
+            categories.append(str(column))
+        else:
+            dtypes[str(column)] = "str"
+
+    return {"dtypes": dtypes, "categories": categories}
+
+#===========================================================================
+# This function returns the text and category columns of the schema that
+# pandas parsed as numbers or booleans in a DataFrame, e.g. a code column
+# whose first chunk held only digits.
+#===========================================================================
+def misparsed(df, schema):
+    '''
+    :param df: DataFrame parsed without the schema
+    :param schema: Schema returned by learn() or load()
+    '''
+
+    text = [column for column, dtype in schema["dtypes"].items() if dtype == "str"] + schema["categories"]
+
+    return [column for column in text if column in df.columns
+            and (pandas.api.types.is_numeric_dtype(df[column]) or pandas.api.types.is_bool_dtype(df[column]))]
+
+#===========================================================================
+# This function returns the dtype argument for pandas.read_csv.
+#===========================================================================
+def read_dtypes(schema):
+    '''
+    :param schema: Schema returned by learn() or load()
+    '''
+
+    dtypes = dict(schema["dtypes"])
+    for column in schema["categories"]:
+        dtypes[column] = "category"
+
+    return dtypes
+
+#===========================================================================
+# This function combines DataFrames parsed with the schema. Each chunk has
+# its own categories, which would make pandas.concat fall back to object
+# columns, so the categories are unioned before concatenating.
+#===========================================================================
+def concat(frames, schema):
+    '''
+    :param frames: List of DataFrames parsed with read_dtypes(schema)
+    :param schema: Schema returned by learn() or load()
+    '''
+
+    if not frames:
+        return pandas.DataFrame()
+
+    for column in schema["categories"]:
+        if column not in frames[0].columns:
+            continue
+        members = pandas.api.types.union_categoricals([frame[column] for frame in frames]).categories
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(members)
+
+    return pandas.concat(frames, ignore_index=True)
+
+#===========================================================================
+# This function converts the category columns of a DataFrame parsed without
+# a schema, e.g. on the download that learned it.
+#===========================================================================
+def apply(df, schema):
+    '''
+    :param df: DataFrame to convert
+    :param schema: Schema returned by learn() or load()
+    '''
+
+    for column in schema["categories"]:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+
+    return df
+
+def load(path):
+    '''
+    :param path: Path to the schema file
+    '''
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+def save(schema, path):
+    '''
+    :param schema: Schema returned by learn()
+    :param path: Path to the schema file
+    '''
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(schema, f)
+    os.replace(temp_path, path)
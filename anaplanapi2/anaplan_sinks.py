@@ -0,0 +1,187 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Sinks that receive the chunks of an Anaplan file download. A
+#                 single download can fan each chunk out to several sinks, so
+#                 the same export is written to disk, parsed and hashed in one
+#                 pass.
+# Input:          Raw bytes of each downloaded chunk
+# Output:         The result of each sink once the download is complete
+#===============================================================================
+
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import tempfile
+import pandas
+
+#===============================================================================
+# Base class for download sinks. write() is called with the bytes of every
+# chunk in order, close() once all chunks have been received; the value
+# returned by close() is the result reported for the sink. If the download
+# fails, abort() is called instead of close() to release the sink without
+# producing a result.
+#===============================================================================
+class Sink(object):
+    '''
+    Base class for download sinks
+    '''
+
+    def write(self, data):
+        '''
+        :param data: Bytes of the downloaded chunk
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        return None
+
+    def abort(self):
+        pass
+
+#===============================================================================
+# Writes the download to a local file.
+#===============================================================================
+class FileSink(Sink):
+    '''
+    Writes the download to a local file and returns its path
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: Path of the local file to write
+        '''
+
+        self.path = path
+        self.file = open(path, "wb")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        return self.path
+
+    def abort(self):
+        #A partial download is removed rather than left looking like a complete file
+        self.close()
+        os.remove(self.path)
+
+#===============================================================================
+# Writes the download to a compressed local file.
+#===============================================================================
+class CompressedFileSink(FileSink):
+    '''
+    Writes the download to a gzip, bz2, xz or zstd compressed local file and returns its path
+    '''
+
+    def __init__(self, path, compression="gzip"):
+        '''
+        :param path: Path of the local file to write
+        :param compression: "gzip", "bz2", "xz" or "zstd"; zstd requires the zstandard package
+        '''
+
+        self.path = path
+        if compression == "gzip":
+            self.file = gzip.open(path, "wb")
+        elif compression == "bz2":
+            self.file = bz2.open(path, "wb")
+        elif compression == "xz":
+            self.file = lzma.open(path, "wb")
+        elif compression == "zstd":
+            import zstandard
+            self.raw = open(path, "wb")
+            self.file = zstandard.ZstdCompressor().stream_writer(self.raw)
+        else:
+            raise ValueError("Unsupported compression: " + str(compression))
+
+    def close(self):
+        self.file.close()
+        if hasattr(self, "raw"):
+            self.raw.close()
+        return self.path
+
+#===============================================================================
+# Builds a Pandas DataFrame from the download. Chunks are spooled to memory,
+# or to a temporary file once they exceed spool_size, and parsed once at the
+# end so quoted fields spanning chunk boundaries are handled correctly.
+#===============================================================================
+class DataFrameSink(Sink):
+    '''
+    Parses the download into a Pandas DataFrame
+    '''
+
+    def __init__(self, delimiter=",", header_row=0, spool_size=64 * 1024 * 1024, **read_csv_args):
+        '''
+        :param delimiter: Delimiter to use default ,
+        :param header_row: Row number(s) to use as the column names, and the start of the data
+        :param spool_size: Number of bytes held in memory before spooling to a temporary file
+        :param read_csv_args: Further keyword arguments passed to pandas.read_csv
+        '''
+
+        self.delimiter = delimiter
+        self.header_row = header_row
+        self.read_csv_args = read_csv_args
+        self.spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+
+    def write(self, data):
+        self.spool.write(data)
+
+    def close(self):
+        if self.spool.tell() == 0:
+            self.spool.close()
+            return pandas.DataFrame()
+        self.spool.seek(0)
+        try:
+            return pandas.read_csv(self.spool, header=self.header_row, sep=self.delimiter, **self.read_csv_args)
+        finally:
+            self.spool.close()
+
+    def abort(self):
+        self.spool.close()
+
+#===============================================================================
+# Computes a digest of the download for auditing.
+#===============================================================================
+class DigestSink(Sink):
+    '''
+    Hashes the download and returns the hex digest
+    '''
+
+    def __init__(self, algorithm="sha256"):
+        '''
+        :param algorithm: Any algorithm supported by hashlib
+        '''
+
+        self.hash = hashlib.new(algorithm)
+
+    def write(self, data):
+        self.hash.update(data)
+
+    def close(self):
+        return self.hash.hexdigest()
+
+#===============================================================================
+# Passes every chunk to a user function.
+#===============================================================================
+class CallbackSink(Sink):
+    '''
+    Calls a user function with each chunk and its number, returns the number of chunks received
+    '''
+
+    def __init__(self, callback):
+        '''
+        :param callback: Function called as callback(data, chunk_number)
+        '''
+
+        self.callback = callback
+        self.chunks = 0
+
+    def write(self, data):
+        self.callback(data, self.chunks)
+        self.chunks += 1
+
+    def close(self):
+        return self.chunks
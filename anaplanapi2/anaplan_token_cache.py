@@ -0,0 +1,189 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    On-disk cache of Anaplan authorization tokens shared by every
+#                 process on the host. The cache file is readable only by its
+#                 owner and is guarded by an exclusive file lock, so when many
+#                 jobs start at once exactly one of them authenticates and the
+#                 others reuse its token. Entries are keyed by an HMAC of the
+#                 credentials under a random secret kept beside the cache.
+# Input:          Credential identity, function that authenticates with Anaplan
+# Output:         Authorization header string
+#===============================================================================
+
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__cache_path__ = os.path.join(os.path.expanduser("~"), ".anaplanapi2", "tokens.json")
+__refresh_margin__ = 300
+
+class TokenCache(object):
+    '''
+    File-locked token cache keyed by credential identity
+    '''
+
+    def __init__(self, path=None, refresh_margin=__refresh_margin__):
+        '''
+        :param path: Path of the cache file, defaults to ~/.anaplanapi2/tokens.json
+        :param refresh_margin: Seconds before expiry at which a cached token is no longer handed out
+        '''
+
+        self.path = path or __cache_path__
+        self.refresh_margin = refresh_margin
+        self.secret = None
+
+    #===========================================================================
+    # This function returns the cache key of a credential, see identity().
+    #===========================================================================
+    def identity(self, auth_header):
+        '''
+        :param auth_header: Basic or CACertificate authorization header dict
+        '''
+
+        if self.secret is None:
+            self.secret = self._load_secret()
+
+        return identity(auth_header, self.secret)
+
+    #===========================================================================
+    # This function returns the cached authorization for the identity if it is
+    # still valid. Otherwise it calls authorize() while holding the lock, so
+    # processes waiting on the lock pick up the new token instead of
+    # authenticating themselves. authorize() returns the authorization header
+    # string and its expiry as epoch seconds; errors are returned uncached.
+    #===========================================================================
+    def get(self, identity, authorize):
+        '''
+        :param identity: Credential identity, see TokenCache.identity()
+        :param authorize: Function returning (authorization, expires_at)
+        '''
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        with file_lock(self.path):
+            tokens = self._read()
+            entry = tokens.get(identity)
+            if entry and entry["expires_at"] - self.refresh_margin > time.time():
+                return entry["authorization"]
+
+            authorization, expires_at = authorize()
+            if authorization and not authorization[:5] == "Error":
+                #Drop expired entries while the file is rewritten
+                now = time.time()
+                tokens = {key: value for key, value in tokens.items() if value["expires_at"] > now}
+                tokens[identity] = {"authorization": authorization, "expires_at": expires_at}
+                self._write(tokens)
+            return authorization
+
+    #===========================================================================
+    # This function removes the cached token of an identity, e.g. after the
+    # API rejected it.
+    #===========================================================================
+    def invalidate(self, identity):
+        '''
+        :param identity: Credential identity, see TokenCache.identity()
+        '''
+
+        if not os.path.exists(self.path):
+            return
+
+        with file_lock(self.path):
+            tokens = self._read()
+            if tokens.pop(identity, None) is not None:
+                self._write(tokens)
+
+    #===========================================================================
+    # This function reads the secret keying the cache, creating it readable
+    # only by its owner on first use.
+    #===========================================================================
+    def _load_secret(self):
+        secret_path = self.path + ".key"
+        directory = os.path.dirname(secret_path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        with file_lock(secret_path):
+            if not os.path.exists(secret_path):
+                fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(os.urandom(32))
+            with open(secret_path, "rb") as f:
+                return f.read()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, tokens):
+        temp_path = self.path + ".tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(tokens, f)
+        os.replace(temp_path, self.path)
+
+#===========================================================================
+# This function derives the cache key of a credential from its authorization
+# header. The key is an HMAC under a secret that never leaves the host, so a
+# copy of the cache cannot be used to guess passwords offline.
+#===========================================================================
+def identity(auth_header, secret):
+    '''
+    :param auth_header: Basic or CACertificate authorization header dict
+    :param secret: Random bytes keying the HMAC, see TokenCache.identity()
+    '''
+
+    value = "".join(str(auth_header[key]) for key in sorted(auth_header))
+
+    return hmac.new(secret, value.encode('utf-8'), hashlib.sha256).hexdigest()
+
+#===========================================================================
+# This function holds an exclusive lock on path + ".lock" for the duration
+# of a with block, across threads and processes.
+#===========================================================================
+@contextlib.contextmanager
+def file_lock(path):
+    '''
+    :param path: Path of the file to guard
+    '''
+
+    lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        _lock(lock_fd)
+        try:
+            yield
+        finally:
+            _unlock(lock_fd)
+    finally:
+        os.close(lock_fd)
+
+def _lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,139 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Adaptive chunk size and concurrency tuning for uploads. The
+#                 tuner measures the throughput of each window of chunks and
+#                 hill-climbs the chunk size and the number of chunks in flight,
+#                 one at a time, towards the highest throughput. The settings
+#                 reached are saved per job so the next run starts from them.
+# Input:          Size and completion time of every uploaded chunk
+# Output:         Chunk size in bytes and number of chunks in flight
+#===============================================================================
+
+import json
+import logging
+import os
+import threading
+import time
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__BYTES__ = 1024 * 1024
+__state_path__ = os.path.join(os.path.expanduser("~"), ".anaplanapi2", "tuning.json")
+__min_gain__ = 1.05
+
+class ChunkTuner(object):
+    '''
+    Tunes the chunk size and number of chunks in flight of an upload
+    '''
+
+    def __init__(self, job=None, chunk_mb=10, in_flight=1, min_mb=1, max_mb=50, max_in_flight=8, state_path=None):
+        '''
+        :param job: Name of the job, the settings reached are saved and reused under this name
+        :param chunk_mb: Starting chunk size in megabytes, when no saved settings exist
+        :param in_flight: Starting number of chunks uploaded at the same time, when no saved settings exist
+        :param min_mb: Smallest chunk size in megabytes
+        :param max_mb: Largest chunk size in megabytes, the API allows at most 50
+        :param max_in_flight: Largest number of chunks uploaded at the same time
+        :param state_path: JSON file holding the saved settings, defaults to ~/.anaplanapi2/tuning.json
+        '''
+
+        self.job = job
+        self.min_mb = max(min_mb, 0.1)
+        self.max_mb = min(max_mb, 50)
+        self.max_in_flight = max(max_in_flight, 1)
+        self.state_path = state_path or __state_path__
+        self.chunk_mb = chunk_mb
+        self.in_flight = in_flight
+
+        saved = self._load().get(job) if job is not None else None
+        if saved:
+            self.chunk_mb = saved.get("chunk_mb", chunk_mb)
+            self.in_flight = saved.get("in_flight", in_flight)
+        self.chunk_mb = min(max(self.chunk_mb, self.min_mb), self.max_mb)
+        self.in_flight = min(max(int(self.in_flight), 1), self.max_in_flight)
+
+        #Hill-climbing state: the setting being tuned, its direction and the throughput of the last window
+        self.dimension = "chunk_mb"
+        self.direction = {"chunk_mb": 1, "in_flight": 1}
+        self.last_throughput = None
+        self.lock = threading.Lock()
+        self._start_window()
+
+    #===========================================================================
+    # This function returns the chunk size to use for the next chunk.
+    #===========================================================================
+    def chunk_bytes(self):
+        return int(self.chunk_mb * __BYTES__)
+
+    #===========================================================================
+    # This function records a completed chunk. Once a window of chunks has been
+    # uploaded its throughput is compared with the previous window: after a gain
+    # the same setting keeps moving in the same direction, otherwise the step
+    # is undone, its direction reversed and the other setting is tuned next.
+    #===========================================================================
+    def record(self, nbytes):
+        '''
+        :param nbytes: Size of the uploaded chunk in bytes
+        '''
+
+        with self.lock:
+            self.window_bytes += nbytes
+            self.window_chunks += 1
+            if self.window_chunks < max(2 * self.in_flight, 2):
+                return
+
+            elapsed = max(time.monotonic() - self.window_start, 1e-6)
+            throughput = self.window_bytes / elapsed
+            detail = "{:.2f} MB/s with {} MB chunks, {} in flight".format(throughput / __BYTES__, self.chunk_mb, self.in_flight)
+
+            if self.last_throughput is not None and throughput < self.last_throughput * __min_gain__:
+                #No gain: step back, then measure a new baseline before tuning the other setting
+                self.direction[self.dimension] = -self.direction[self.dimension]
+                self._step()
+                self.dimension = "in_flight" if self.dimension == "chunk_mb" else "chunk_mb"
+                self.last_throughput = None
+            else:
+                self.last_throughput = throughput
+                self._step()
+            self._start_window()
+
+        logging.debug("Chunk tuner: " + detail)
+
+    #===========================================================================
+    # This function saves the current settings under the job name.
+    #===========================================================================
+    def save(self):
+        if self.job is None:
+            return
+
+        state = self._load()
+        state[self.job] = {"chunk_mb": self.chunk_mb, "in_flight": self.in_flight}
+
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _step(self):
+        if self.dimension == "chunk_mb":
+            factor = 1.5 if self.direction["chunk_mb"] > 0 else 1 / 1.5
+            self.chunk_mb = round(min(max(self.chunk_mb * factor, self.min_mb), self.max_mb), 2)
+        else:
+            self.in_flight = min(max(self.in_flight + self.direction["in_flight"], 1), self.max_in_flight)
+
+    def _start_window(self):
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+        self.window_chunks = 0
+
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
@@ -0,0 +1,194 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Pre-flight checks of upload data against the data source
+#                 definition of an Anaplan import: separator, header names,
+#                 number of columns per row and date formats. The checks run
+#                 locally, block by block with vectorized string operations,
+#                 before any bytes are sent to Anaplan.
+# Input:          Local file path or Pandas DataFrame, import data source metadata
+# Output:         List of error messages with row and column positions
+#===============================================================================
+
+import csv
+import io
+import itertools
+import re
+import pandas
+
+#===============================================================================
+# Defining global variables
+#===============================================================================
+__other_separators__ = [",", "\t", ";", "|"]
+
+#===========================================================================
+# This function validates a local delimited file. Rows are numbered as lines
+# of the file, starting from 1; a row spanning several lines is numbered by
+# the line it starts on.
+#===========================================================================
+def validate_file(path, source, date_columns=None, max_errors=100, block_lines=100000):
+    '''
+    :param path: Path to the local file
+    :param source: The "source" section of the import metadata
+    :param date_columns: Dict of column name to strftime format, e.g. {"Date": "%d/%m/%Y"}
+    :param max_errors: Stop after this many errors
+    :param block_lines: Number of rows checked at a time
+    '''
+
+    separator = source.get("columnSeparator", ",")
+    quote = source.get("textDelimiter", '"') or '"'
+    encoding = source.get("textEncoding", "utf-8")
+    header_row = source.get("headerRow", 1)
+    first_data_row = source.get("firstDataRow", header_row + 1)
+    expected = source.get("headerNames") or []
+    column_count = source.get("columnCount") or len(expected)
+
+    errors = []
+    header = []
+    data_lines = []
+    #Bytes that are not valid in the encoding are kept as lone surrogates, which valid text never contains
+    with open(path, "r", encoding=encoding, errors="surrogateescape", newline="") as f:
+        records = _records(f, quote)
+        while len(errors) < max_errors:
+            block = list(itertools.islice(records, block_lines))
+            if not block:
+                break
+            numbers, lines = zip(*block)
+            lines = pandas.Series(lines, index=numbers, dtype=object).str.rstrip("\r\n")
+
+            undecodable = lines[lines.str.contains("[\udc80-\udcff]")]
+            errors.extend("Row " + str(row) + ": not valid " + encoding + "." for row in undecodable.index)
+
+            data = lines[(lines.index >= first_data_row) & (lines != "")]
+            data_lines.extend(data.index)
+
+            if header_row and header_row in lines.index:
+                header = _split(lines[header_row], separator, quote)
+                errors.extend(_check_header(header, lines[header_row], header_row, separator, expected))
+
+            if column_count:
+                errors.extend(_check_column_counts(data, separator, quote, column_count))
+
+    if date_columns and header and len(errors) < max_errors:
+        errors.extend(_check_dates_file(path, source, header, date_columns, block_lines, data_lines))
+
+    return errors[:max_errors]
+
+#===========================================================================
+# This function validates a DataFrame before it is uploaded. Rows are
+# numbered as they will be in the uploaded file, after the header line.
+#===========================================================================
+def validate_dataframe(df, source, date_columns=None, max_errors=100):
+    '''
+    :param df: DataFrame to upload
+    :param source: The "source" section of the import metadata
+    :param date_columns: Dict of column name to strftime format, e.g. {"Date": "%d/%m/%Y"}
+    :param max_errors: Stop after this many errors
+    '''
+
+    expected = source.get("headerNames") or []
+    columns = [str(column) for column in df.columns]
+
+    errors = ["Column '" + name + "' of the import is missing from the data." for name in expected if name not in columns]
+    if date_columns:
+        for column, date_format in date_columns.items():
+            if column not in df.columns:
+                continue
+            values = df[column].astype(str).where(df[column].notna())
+            errors.extend(_check_dates(values, pandas.RangeIndex(2, 2 + len(df.index)), columns.index(column) + 1, column, date_format))
+
+    return errors[:max_errors]
+
+#===========================================================================
+# This function yields the records of a file with the number of the line
+# each starts on. Quoted fields may contain line breaks, so lines are joined
+# while a text delimiter is left open; doubled delimiters inside a quoted
+# field keep the count even.
+#===========================================================================
+def _records(f, quote):
+    record = []
+    start = 0
+    open_quotes = 0
+    for line_number, line in enumerate(f, 1):
+        if not record:
+            start = line_number
+        record.append(line)
+        open_quotes += line.count(quote)
+        if open_quotes % 2 == 0:
+            yield start, "".join(record)
+            record = []
+            open_quotes = 0
+    if record:
+        yield start, "".join(record)
+
+#===========================================================================
+# This function compares the header line with the header names of the
+# import, and detects a file written with a different separator.
+#===========================================================================
+def _check_header(header, line, header_row, separator, expected):
+    errors = []
+    if len(header) == 1 and expected and len(expected) > 1:
+        for other in __other_separators__:
+            if other != separator and other in line:
+                errors.append("Row " + str(header_row) + ": the file appears to use " + repr(other) + " as separator, the import expects " + repr(separator) + ".")
+                return errors
+
+    errors.extend("Column '" + name + "' of the import is missing from the header." for name in expected if name not in header)
+
+    return errors
+
+#===========================================================================
+# This function checks the number of fields of every line. Separators are
+# counted with one vectorized pass; only lines containing the text
+# delimiter, where a separator may be quoted, are parsed with csv.
+#===========================================================================
+def _check_column_counts(lines, separator, quote, column_count):
+    counts = lines.str.count(re.escape(separator)) + 1
+    quoted = lines.str.contains(quote, regex=False)
+    if quoted.any():
+        counts[quoted] = lines[quoted].map(lambda line: len(_split(line, separator, quote)))
+
+    wrong = counts[counts != column_count]
+
+    return ["Row " + str(row) + ": expected " + str(column_count) + " columns, found " + str(count) + "."
+            for row, count in wrong.items()]
+
+#===========================================================================
+# This function checks the date columns of a file, reading only those
+# columns in blocks. data_lines holds the line each data row starts on, as
+# rows with quoted line breaks span several lines.
+#===========================================================================
+def _check_dates_file(path, source, header, date_columns, block_lines, data_lines):
+    header_row = source.get("headerRow", 1)
+    first_data_row = source.get("firstDataRow", header_row + 1)
+
+    reader = pandas.read_csv(path, sep=source.get("columnSeparator", ","), quotechar=source.get("textDelimiter", '"') or '"',
+                             encoding=source.get("textEncoding", "utf-8"), encoding_errors="replace",
+                             header=header_row - 1 if header_row else None,
+                             skiprows=range(header_row, first_data_row - 1), usecols=lambda name: name in date_columns,
+                             dtype=str, keep_default_na=False, chunksize=block_lines)
+
+    data_lines = pandas.Index(data_lines)
+    errors = []
+    for block in reader:
+        if block.index[-1] < len(data_lines):
+            rows = data_lines[block.index]
+        else:
+            rows = block.index + first_data_row
+        for column, date_format in date_columns.items():
+            if column not in block.columns:
+                continue
+            errors.extend(_check_dates(block[column], rows, header.index(column) + 1, column, date_format))
+
+    return errors
+
+def _check_dates(values, rows, position, column, date_format):
+    values = pandas.Series(values.values, index=rows)
+    parsed = pandas.to_datetime(values, format=date_format, errors="coerce")
+    bad = values[parsed.isna() & values.notna() & (values.str.strip() != "")]
+
+    return ["Row " + str(row) + ", column " + str(position) + " ('" + column + "'): " + repr(value) + " does not match the date format " + date_format + "."
+            for row, value in bad.items()]
+
+def _split(line, separator, quote):
+    return next(csv.reader(io.StringIO(line), delimiter=separator, quotechar=quote), [])
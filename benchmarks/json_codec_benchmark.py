@@ -0,0 +1,111 @@
+#===============================================================================
+# Created:        19 Oct 2026
+# @author:        AP
+# Description:    Micro-benchmark of the anaplan_json codec against the previous
+#                 json.loads(response.text) handling, on payloads shaped like the
+#                 task status and resource list responses of the Anaplan API.
+# Usage:          python benchmarks/json_codec_benchmark.py
+#===============================================================================
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from anaplanapi2 import anaplan_json
+
+#===============================================================================
+# Recorded payload shapes
+#===============================================================================
+TASK_IN_PROGRESS = {
+    "meta": {"schema": "https://api.anaplan.com/2/0/objects/task"},
+    "status": {"code": 200, "message": "Success"},
+    "task": {
+        "taskId": "A1B2C3D4E5F60718293A4B5C6D7E8F90",
+        "taskState": "IN_PROGRESS",
+        "creationTime": 1698765432100,
+        "progress": 0.42,
+        "currentStep": "Importing line items."
+    }
+}
+
+TASK_COMPLETE = {
+    "meta": {"schema": "https://api.anaplan.com/2/0/objects/task"},
+    "status": {"code": 200, "message": "Success"},
+    "task": {
+        "taskId": "A1B2C3D4E5F60718293A4B5C6D7E8F90",
+        "taskState": "COMPLETE",
+        "creationTime": 1698765432100,
+        "progress": 1.0,
+        "currentStep": "Complete.",
+        "result": {
+            "failureDumpAvailable": True,
+            "objectId": "118000000001",
+            "successful": True,
+            "nestedResults": [
+                {
+                    "failureDumpAvailable": i % 3 == 0,
+                    "objectId": "1120000000" + str(i).zfill(2),
+                    "successful": True,
+                    "details": [{
+                        "localMessageText": "Sales data import",
+                        "occurrences": 0,
+                        "type": "hierarchyRowsProcessedWithFailures",
+                        "values": ["Rows processed", str(1000 * i), "Rows ignored", str(i)]
+                    }]
+                } for i in range(40)
+            ]
+        }
+    }
+}
+
+RESOURCE_LIST = {
+    "meta": {"paging": {"currentPageSize": 2000, "offset": 0, "totalSize": 2000},
+             "schema": "https://api.anaplan.com/2/0/models/ABCDEF/objects/import"},
+    "status": {"code": 200, "message": "Success"},
+    "imports": [
+        {
+            "id": "112000000" + str(i).zfill(3),
+            "name": "Load Region " + str(i) + " Sales.csv",
+            "importDataSourceId": "113000000" + str(i).zfill(3),
+            "importType": "MODULE_DATA"
+        } for i in range(2000)
+    ]
+}
+
+#===========================================================================
+# This function times a callable and returns the best time per call in
+# microseconds.
+#===========================================================================
+def best_time(function, number, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+def main():
+    print("anaplan_json backend: " + anaplan_json.__backend__)
+    print("{:<22}{:>16}{:>16}{:>10}".format("payload", "before (us)", "after (us)", "speedup"))
+
+    for name, payload, number, parses_before in [("task in progress", TASK_IN_PROGRESS, 20000, 1),
+                                                 ("task complete", TASK_COMPLETE, 2000, 2),
+                                                 ("resource list", RESOURCE_LIST, 200, 1)]:
+        content = json.dumps(payload).encode('utf-8')
+
+        #check_status used to parse the completed task body twice from response.text
+        def before():
+            for _ in range(parses_before):
+                json.loads(content.decode('utf-8'))
+
+        def after():
+            anaplan_json.loads(content)
+
+        time_before = best_time(before, number)
+        time_after = best_time(after, number)
+        print("{:<22}{:>16.1f}{:>16.1f}{:>9.1f}x".format(name, time_before, time_after, time_before / time_after))
+
+    body = {"localeName": "en_US", "mappingParameters": [{"entityType": "Region", "entityName": "EMEA"}]}
+    time_before = best_time(lambda: json.dumps(body).encode('utf-8'), 50000)
+    time_after = best_time(lambda: anaplan_json.dumps(body), 50000)
+    print("{:<22}{:>16.1f}{:>16.1f}{:>9.1f}x".format("task request body", time_before, time_after, time_before / time_after))
+
+if __name__ == "__main__":
+    main()
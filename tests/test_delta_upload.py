@@ -0,0 +1,75 @@
+import pandas
+import pytest
+from types import SimpleNamespace
+from anaplanapi2 import anaplan, anaplan_fingerprint, anaplan_governor
+
+conn = SimpleNamespace(authorization="AnaplanAuthToken x", workspaceGuid="w", modelGuid="m")
+
+class Response(object):
+    def __init__(self, status_code=200, text="{}"):
+        self.status_code = status_code
+        self.ok = status_code < 300
+        self.text = text
+        self.content = text.encode('utf-8')
+
+@pytest.fixture
+def server(monkeypatch):
+    calls = []
+    failures = {}
+    def request(method, url, **kwargs):
+        calls.append((method, url, kwargs.get("data")))
+        return failures.get((method, url.rsplit("/", 1)[-1]), Response())
+    monkeypatch.setattr(anaplan_governor, "request", request)
+    return SimpleNamespace(calls=calls, failures=failures)
+
+def test_compare_classifies_rows():
+    previous = anaplan_fingerprint.fingerprint(pandas.DataFrame({"id": [1, 2, 3], "v": ["a", "b", "c"]}), "id")
+    current = anaplan_fingerprint.fingerprint(pandas.DataFrame({"id": [1, 2, 4], "v": ["a", "B", "d"]}), "id")
+
+    inserted, changed, deleted = anaplan_fingerprint.compare(current, previous, "id")
+
+    assert list(inserted) == [False, False, True]
+    assert list(changed) == [False, True, False]
+    assert list(deleted["id"]) == [3]
+
+def test_compare_without_previous_index_inserts_everything():
+    current = anaplan_fingerprint.fingerprint(pandas.DataFrame({"id": [1, 2], "v": ["a", "b"]}), "id")
+
+    inserted, changed, deleted = anaplan_fingerprint.compare(current, None, "id")
+
+    assert inserted.all() and not changed.any() and deleted.empty
+
+def test_fingerprint_rejects_duplicate_keys():
+    with pytest.raises(ValueError):
+        anaplan_fingerprint.fingerprint(pandas.DataFrame({"id": [1, 1], "v": ["a", "b"]}), "id")
+
+def test_delta_upload_sends_only_changed_rows(server, tmp_path):
+    anaplan.stream_upload_df_delta(conn, "f", pandas.DataFrame({"id": [1, 2], "v": ["a", "b"]}), 10, "id", str(tmp_path))
+    del server.calls[:]
+
+    status, deleted = anaplan.stream_upload_df_delta(conn, "f", pandas.DataFrame({"id": [1, 3], "v": ["a", "c"]}), 10, "id", str(tmp_path))
+
+    assert status.startswith("File upload complete")
+    assert [data for method, url, data in server.calls if method == "PUT"] == [b"id,v\n3,c\n"]
+    assert list(deleted["id"]) == [2]
+
+def test_delta_upload_keeps_index_when_a_chunk_fails(server, tmp_path):
+    df = pandas.DataFrame({"id": [1, 2], "v": ["a", "b"]})
+    server.failures[("PUT", "0")] = Response(500, "Internal Server Error")
+
+    status, deleted = anaplan.stream_upload_df_delta(conn, "f", df, 10, "id", str(tmp_path))
+
+    assert not status.startswith("File upload complete")
+    assert not any(url.endswith("/complete") for method, url, data in server.calls)
+    assert anaplan_fingerprint.load_index(anaplan_fingerprint.index_path("w", "m", "f", str(tmp_path))) is None
+
+    del server.failures[("PUT", "0")]
+    status, deleted = anaplan.stream_upload_df_delta(conn, "f", df, 10, "id", str(tmp_path))
+
+    assert status.startswith("File upload complete")
+
+def test_delta_upload_rejects_duplicate_keys(server, tmp_path):
+    status, deleted = anaplan.stream_upload_df_delta(conn, "f", pandas.DataFrame({"id": [1, 1], "v": ["a", "b"]}), 10, "id", str(tmp_path))
+
+    assert "not unique" in status
+    assert server.calls == []
@@ -0,0 +1,52 @@
+import threading
+import time
+import pytest
+from anaplanapi2 import anaplan_governor
+
+class Response(object):
+    def __init__(self, size):
+        self.content = b"x" * size
+
+@pytest.fixture
+def downloads(monkeypatch):
+    monkeypatch.setattr(anaplan_governor.requests, "request", lambda method, url, **kwargs: Response(50000))
+    yield
+    anaplan_governor.configure()
+
+def test_downloads_are_throttled(downloads):
+    anaplan_governor.configure(bytes_per_second=100000)
+
+    start = time.monotonic()
+    for i in range(4):
+        anaplan_governor.get("https://api.anaplan.com/file")
+
+    #The first three fit in the burst and its debt, the fourth waits for 0.5s of debt to be repaid
+    assert time.monotonic() - start >= 0.4
+
+def test_request_without_body_waits_for_download_debt(downloads):
+    governor = anaplan_governor.configure(bytes_per_second=100000)
+    governor.charge(150000)
+
+    start = time.monotonic()
+    governor.acquire(0)
+
+    assert time.monotonic() - start >= 0.4
+
+def test_waiters_are_served_by_priority():
+    governor = anaplan_governor.Governor(requests_per_second=10, burst_seconds=0.1)
+    governor.acquire()
+    order = []
+
+    def wait(priority):
+        governor.acquire(0, priority)
+        order.append(priority)
+
+    bulk = threading.Thread(target=wait, args=(anaplan_governor.BULK,))
+    bulk.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=wait, args=(anaplan_governor.INTERACTIVE,))
+    interactive.start()
+    bulk.join()
+    interactive.join()
+
+    assert order == [anaplan_governor.INTERACTIVE, anaplan_governor.BULK]